@@ -0,0 +1,196 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# BENCHMARKS: MOCK PDF SERVER
+# This module provides the local, offline test bed used by run_benchmarks.py.
+# It performs the following tasks:
+# 1. Starts one local HTTP server per simulated host (127.0.0.1, 127.0.0.2, ...).
+# 2. Serves synthetic PDFs of the size asked in the URL ("/<id>.pdf?size=<bytes>"),
+#    and HTML report pages under "/<id>.html".
+# 3. Adds a configurable latency before each answer and answers a share of requests with 503.
+# 4. Answers "304 Not Modified" to requests whose If-None-Match matches the PDF's ETag.
+# 5. Builds synthetic source sheets (BRnum, Pdf_URL, Report Html Address) pointing at these servers.
+# This makes benchmark runs reproducible and independent of the network.
+
+# mock_server.py
+
+import functools
+import hashlib
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+PDF_HEADER = b"%PDF-1.4\n"
+PDF_TRAILER = b"\n%%EOF\n"
+HTML_PAGE = b"<html><body>Annual report</body></html>"
+
+
+# Function to build a syntactically plausible PDF body of `size` bytes (cached per size)
+@functools.lru_cache(maxsize=32)
+def synthetic_pdf(size):
+    filler = max(0, size - len(PDF_HEADER) - len(PDF_TRAILER))
+    return PDF_HEADER + b"0" * filler + PDF_TRAILER
+
+
+# Function to build the ETag of a body
+def etag_of(body):
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+class MockPdfHandler(BaseHTTPRequestHandler):
+    """
+    Serves synthetic PDFs and HTML pages according to the settings of its MockPdfServer.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, like real servers
+
+    def do_GET(self):
+        self._answer(send_body=True)
+
+    def do_HEAD(self):
+        self._answer(send_body=False)
+
+    def _answer(self, send_body):
+        settings = self.server.settings
+        settings.count_request()
+        if settings.latency:
+            time.sleep(settings.latency)
+        if settings.fail():
+            self._send(503, "text/plain", b"", send_body)
+            return
+
+        parts = urlsplit(self.path)
+        if parts.path.endswith(".html"):
+            self._send(200, "text/html", HTML_PAGE, send_body)
+        elif parts.path.endswith(".pdf"):
+            size = int(parse_qs(parts.query).get("size", [settings.default_size])[0])
+            body = synthetic_pdf(size)
+            if self.headers.get("If-None-Match") == etag_of(body):
+                self._send(304, "application/pdf", b"", send_body)  # Revalidation of an unchanged PDF
+            else:
+                self._send(200, "application/pdf", body, send_body)
+        else:
+            self._send(404, "text/plain", b"", send_body)
+
+    def _send(self, status, content_type, body, send_body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 200:
+            self.send_header("ETag", etag_of(body))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _QuietServer(ThreadingHTTPServer):
+    # Clients closing keep-alive connections are normal here, not errors worth a traceback
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+class _Settings:
+    # Behaviour shared by the servers of one MockPdfServer
+    def __init__(self, latency, error_rate, default_size, seed):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.default_size = default_size
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+class MockPdfServer:
+    """
+    Local HTTP servers simulating several report hosts.
+
+    Args:
+        hosts (int): Number of simulated hosts. Each one listens on its own loopback address
+            (127.0.0.<n>); where only 127.0.0.1 is available, they share it on different ports.
+        latency (float): Seconds waited before each answer.
+        error_rate (float): Share of requests answered with "503 Service Unavailable".
+        default_size (int): Size of a PDF whose URL does not give one, in bytes.
+        seed (int): Seed of the error draws, for reproducible runs.
+    """
+
+    def __init__(self, hosts=1, latency=0.0, error_rate=0.0, default_size=100_000, seed=0):
+        self.hosts = max(1, hosts)
+        self.settings = _Settings(latency, error_rate, default_size, seed)
+        self.base_urls = []
+        self._servers = []
+
+    def start(self):
+        for index in range(self.hosts):
+            address = f"127.0.0.{index + 1}"
+            try:
+                server = _QuietServer((address, 0), MockPdfHandler)
+            except OSError:
+                address = "127.0.0.1"
+                server = _QuietServer((address, 0), MockPdfHandler)
+            server.settings = self.settings
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+            self.base_urls.append(f"http://{address}:{server.server_address[1]}")
+        return self.base_urls
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+# Function to build a synthetic source sheet whose URLs point at the mock servers
+def make_source_frame(rows, base_urls, size=100_000, html_rate=0.0, seed=0):
+    """
+    Args:
+        rows (int): Number of rows.
+        base_urls (list): Base URLs of the mock hosts; rows are spread over them in turn.
+        size (int): Size of each PDF, in bytes.
+        html_rate (float): Share of rows whose primary URL is an HTML page, with the PDF in the
+            alternative column (exercises the fallback).
+        seed (int): Seed of the HTML draws.
+
+    Returns:
+        pd.DataFrame: Columns BRnum, Pdf_URL and Report Html Address.
+    """
+    draw = random.Random(seed)
+    brnums, primary, alternative = [], [], []
+    for index in range(rows):
+        base = base_urls[index % len(base_urls)]
+        pdf_url = f"{base}/report{index}.pdf?size={size}"
+        brnums.append(f"BR{index:06d}")
+        if draw.random() < html_rate:
+            primary.append(f"{base}/report{index}.html")
+            alternative.append(pdf_url)
+        else:
+            primary.append(pdf_url)
+            alternative.append(None)
+    return pd.DataFrame({"BRnum": brnums, "Pdf_URL": primary, "Report Html Address": alternative})
@@ -0,0 +1,195 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# BENCHMARKS: OFFLINE BENCHMARK RUNNER
+# This script measures the downloader against the local mock server, without network access.
+# It performs the following tasks:
+# 1. Starts the mock PDF server (hosts, PDF size, latency and error rate are configurable).
+# 2. Writes a synthetic source workbook for each requested row count and times its loading.
+# 3. Runs each engine configuration in a fresh process and reports rows/s, MB/s and peak RSS.
+# 4. Times the metadata writes: one batched workbook write and the legacy per-row update.
+# 5. Prints a table and optionally saves every result as JSON, to compare runs.
+# Usage (from the repository root):
+#     python benchmarks/run_benchmarks.py --rows 1000 10000 --hosts 4 --latency 0.02 --output bench.json
+
+# run_benchmarks.py
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "src"))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from mock_server import MockPdfServer, make_source_frame
+from load_excel import load_excel
+from metadata_writer import MetadataWriter
+from update_metadata import update_metadata
+from retry_policy import RetryPolicy
+from run_metrics import RunMetrics, configure_logging
+
+# Engine configurations that can be benchmarked
+ENGINES = ("threaded", "threaded-adaptive", "async")
+
+# Columns of the synthetic sheets
+BRNUM_COL, PRIMARY_COL, ALTERNATIVE_COL = "BRnum", "Pdf_URL", "Report Html Address"
+
+# Rows timed with the legacy per-row update_metadata (it rewrites the whole workbook each time)
+LEGACY_UPDATE_ROWS = 50
+
+
+# Function to read the peak resident memory of the current process, in MB (None if unknown)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KB on Linux
+
+
+# Function to run one engine configuration over a workbook (called in a fresh process)
+def run_engine(engine, workbook_path, work_folder, workers=None):
+    """
+    Returns:
+        dict: Elapsed time, rows/s, MB/s, peak RSS, statuses and stage timings of the run.
+    """
+    from http_session import configure_sessions, close_session
+    from threaded_executor import run_threaded_execution
+    from concurrency_controller import AdaptiveConcurrency
+
+    configure_logging("WARNING")
+    download_folder = os.path.join(work_folder, "downloads")
+    os.makedirs(download_folder, exist_ok=True)
+    metadata_file_path = os.path.join(work_folder, "Metadata.xlsx")
+    df = load_excel(workbook_path, [BRNUM_COL, PRIMARY_COL, ALTERNATIVE_COL])
+    metrics = RunMetrics()
+    retry_policy = RetryPolicy(max_attempts=3, base_delay=0.05, max_delay=1.0)
+
+    started = time.perf_counter()
+    if engine == "async":
+        from async_executor import run_async_execution
+        run_async_execution(df, download_folder, metadata_file_path, PRIMARY_COL, ALTERNATIVE_COL, BRNUM_COL,
+                            download_options={"timeout": 30}, max_concurrency=workers or 200,
+                            retry_policy=retry_policy, result_sink=lambda result: None, metrics=metrics)
+    else:
+        configure_sessions(pool_connections=100, pool_maxsize=64)
+        concurrency = AdaptiveConcurrency(min_workers=4, max_workers=workers or 64) \
+            if engine == "threaded-adaptive" else None
+        try:
+            run_threaded_execution(df, download_folder, metadata_file_path, PRIMARY_COL, ALTERNATIVE_COL,
+                                   BRNUM_COL, download_options={"timeout": 30}, retry_policy=retry_policy,
+                                   max_workers=workers, result_sink=lambda result: None,
+                                   concurrency=concurrency, metrics=metrics)
+        finally:
+            close_session()
+    elapsed = time.perf_counter() - started
+
+    summary = metrics.summary()
+    return {
+        "engine": engine,
+        "rows": summary["rows"],
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(summary["rows"] / elapsed, 1),
+        "megabytes_per_second": round(summary["bytes"] / 1e6 / elapsed, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "status_counts": summary["status_counts"],
+        "stage_mean_seconds": {name: stage["mean"] for name, stage in summary["stages"].items()},
+    }
+
+
+# Function to run `run_engine` in a fresh process, so peak RSS and imports are measured per configuration
+def run_engine_isolated(engine, workbook_path, work_folder, workers=None):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_engine, (engine, workbook_path, work_folder, workers))
+
+
+# Function to time the metadata writes for a number of rows
+def benchmark_metadata_write(rows, work_folder):
+    """
+    Returns:
+        dict: Seconds for one batched write of `rows` entries, and seconds per legacy update_metadata call.
+    """
+    metadata_file_path = os.path.join(work_folder, "Metadata_write.xlsx")
+    writer = MetadataWriter(metadata_file_path, flush_every=rows + 1, flush_interval=3600)
+    for index in range(rows):
+        writer.submit(f"BR{index:06d}", "Downloaded", status_detail="ok", attempts=1)
+    started = time.perf_counter()
+    writer.close()  # Single write of the whole table
+    batched = time.perf_counter() - started
+
+    legacy_rows = min(rows, LEGACY_UPDATE_ROWS)
+    started = time.perf_counter()
+    for index in range(legacy_rows):
+        update_metadata(f"BRX{index:06d}", "Downloaded", metadata_file_path)
+    legacy = (time.perf_counter() - started) / legacy_rows if legacy_rows else 0.0
+    return {"batched_write_seconds": round(batched, 3), "legacy_update_seconds_per_row": round(legacy, 4)}
+
+
+# Function to run every benchmark and return the results
+def run_benchmarks(row_counts, engines=ENGINES, hosts=4, size=100_000, latency=0.02, error_rate=0.0,
+                   html_rate=0.1, workers=None, isolated=True):
+    results = []
+    with MockPdfServer(hosts, latency, error_rate, default_size=size) as server, \
+            tempfile.TemporaryDirectory() as temp_folder:
+        for rows in row_counts:
+            workbook_path = os.path.join(temp_folder, f"source_{rows}.xlsx")
+            make_source_frame(rows, server.base_urls, size, html_rate).to_excel(workbook_path, index=False)
+
+            started = time.perf_counter()
+            load_excel(workbook_path, [BRNUM_COL, PRIMARY_COL, ALTERNATIVE_COL], os.path.join(temp_folder, "cache"))
+            cold = time.perf_counter() - started
+            started = time.perf_counter()
+            load_excel(workbook_path, [BRNUM_COL, PRIMARY_COL, ALTERNATIVE_COL], os.path.join(temp_folder, "cache"))
+            warm = time.perf_counter() - started
+            common = {"rows": rows, "hosts": hosts, "size": size, "latency": latency, "error_rate": error_rate,
+                      "load_seconds": round(cold, 3), "cached_load_seconds": round(warm, 3)}
+            common.update(benchmark_metadata_write(rows, temp_folder))
+
+            for engine in engines:
+                work_folder = os.path.join(temp_folder, f"{engine}_{rows}")
+                os.makedirs(work_folder)
+                run = run_engine_isolated if isolated else run_engine
+                result = dict(common, **run(engine, workbook_path, work_folder, workers))
+                results.append(result)
+                print_result(result)
+    return results
+
+
+# Function to print one result as a table line
+def print_result(result):
+    print(f"{result['engine']:<18} rows={result['rows']:<7} {result['elapsed_seconds']:>8.2f} s "
+          f"{result['rows_per_second']:>9.1f} rows/s {result['megabytes_per_second']:>8.2f} MB/s "
+          f"peak RSS={result['peak_rss_mb']} MB load={result['load_seconds']} s (cached {result['cached_load_seconds']} s) "
+          f"metadata write={result['batched_write_seconds']} s (legacy {result['legacy_update_seconds_per_row']} s/row)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the PDF downloader.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000], help="Row counts of the synthetic sheets")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--hosts", type=int, default=4, help="Number of simulated hosts")
+    parser.add_argument("--size", type=int, default=100_000, help="Size of each PDF in bytes")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds before each server answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--html-rate", type=float, default=0.1, help="Share of rows with an HTML primary URL")
+    parser.add_argument("--workers", type=int, default=None, help="Threads (or async concurrency) per engine")
+    parser.add_argument("--output", help="JSON file receiving all results")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rows, args.engines, args.hosts, args.size, args.latency, args.error_rate,
+                             args.html_rate, args.workers)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 11: ASYNCIO EXECUTION ENGINE
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module is an alternative to threaded_executor.py built on asyncio and aiohttp.
+# It performs the following tasks:
+# 1. Keeps hundreds of downloads in flight on one thread, bounded by a global semaphore.
+# 2. Validates and downloads each row with the same single-request logic as fetch_valid_pdf.
+# 3. Sends every status to the single metadata writer, like the threaded engine.
+# 4. Returns the same sorted (BRnum, status) results as run_threaded_execution.
+# 5. Reports the same stage timings and per-host latencies to run_metrics.
+# 6. Optionally hands each downloaded file to the PDF verifier's worker processes.
+# 7. Optionally skips URLs that the prevalidation stage found dead or not PDFs.
+# 8. Runs the file operations (writes, renames, resume state, journal appends) in worker threads,
+#    off the event loop.
+# It lets a large sheet saturate the network link instead of being bound by the thread count.
+# aiohttp is optional: it is only needed when this engine is selected in main.py.
+
+# async_executor.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from contextlib import nullcontext
+
+try:
+    import aiohttp
+except ImportError:  # Optional dependency, only required by this engine
+    aiohttp = None
+
+from validate_urls import candidate_urls
+from download_pdf import (CHUNK_SIZE, MAX_FILE_SIZE, TIMEOUT, PART_SUFFIX, PDF_MAGIC, FileTooLargeError,
+                          pdf_file_name, check_content_length, is_pdf_response, load_resume_state,
+                          save_resume_state, clear_resume_state, hash_part_file, reuse_cached_pdf)
+from http_cache import HttpCache
+from metadata_writer import MetadataWriter
+from content_store import ContentStore
+from pdf_verifier import PdfVerifier
+from retry_policy import (RetryPolicy, OK, NO_URL, TIMED_OUT, CONNECTION_ERROR, NOT_PDF, TOO_LARGE,
+                          DISK_ERROR, REQUEST_ERROR, classify_status)
+import run_metrics
+
+logger = logging.getLogger(__name__)
+
+# Default number of rows processed at the same time
+MAX_CONCURRENCY = 200
+
+
+# Function to run the asyncio engine over every row (same contract as run_threaded_execution)
+def run_async_execution(df, download_folder, metadata_file_path, primary_col, alternative_col, brnum_col,
+                        metadata_flush_every=500, metadata_flush_interval=30.0, journal_file_path=None,
+                        download_options=None, max_concurrency=MAX_CONCURRENCY, max_per_host=10, retry_policy=None,
+                        deduplicate=False, http_cache=None, result_sink=None, metrics=None, verify_pdfs=False,
+                        verify_processes=None, url_checks=None):
+    if aiohttp is None:
+        raise ImportError("The async engine requires aiohttp: pip install aiohttp")
+    if http_cache is not None:
+        download_options = dict(download_options or {}, http_cache=http_cache)
+
+    metadata_writer = MetadataWriter(metadata_file_path, metadata_flush_every, metadata_flush_interval,
+                                     journal_path=journal_file_path)
+    verifier = PdfVerifier(metadata_writer, verify_processes, http_cache=http_cache) if verify_pdfs else None
+    try:
+        with metadata_writer, verifier or nullcontext():
+            results = asyncio.run(_run_rows(df, download_folder, primary_col, alternative_col, brnum_col,
+                                            metadata_writer, download_options or {}, max_concurrency, max_per_host,
+                                            retry_policy or RetryPolicy(max_attempts=1),
+                                            ContentStore(download_folder) if deduplicate else None,
+                                            result_sink, metrics, verifier, url_checks))
+    finally:
+        if http_cache is not None:
+            http_cache.save()
+
+    # Sort results by BRnum for consistency
+    results.sort(key=lambda x: x[0])
+    return results
+
+
+async def _run_rows(df, download_folder, primary_col, alternative_col, brnum_col, metadata_writer,
+                    download_options, max_concurrency, max_per_host, retry_policy, content_store, result_sink=None,
+                    metrics=None, verifier=None, url_checks=None):
+    results = []
+    url_tasks = {} if content_store is not None else None  # One fetch per distinct URL when deduplicating
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=max_per_host)
+
+    async def run_one(row):
+        try:
+            with metrics.row() if metrics is not None else nullcontext() as record:
+                result = await process_row_async(session, row, download_folder, primary_col, alternative_col,
+                                                 brnum_col, metadata_writer, download_options, retry_policy,
+                                                 content_store, url_tasks, verifier, url_checks)
+                if record is not None:
+                    record["brnum"], record["status"] = result
+            if result_sink is not None:
+                result_sink(result)
+            else:
+                results.append(result)
+            logger.debug("Row %s with BRnum %s processed with result: %s", row.name, row[brnum_col], result[1])
+        except Exception as e:
+            logger.error("Error processing row %s with BRnum %s: %s", row.name, row.get(brnum_col, 'Unknown'), e)
+        finally:
+            semaphore.release()
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = set()
+        for _, row in df.iterrows():
+            # Only create a task when a slot is free, so pending rows are not all materialized as tasks
+            await semaphore.acquire()
+            task = asyncio.create_task(run_one(row))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    return results
+
+
+# Coroutine to process one row (same contract as threaded_executor.process_row)
+async def process_row_async(session, row, download_folder, primary_col, alternative_col, brnum_col,
+                            metadata_writer, download_options, retry_policy, content_store=None, url_tasks=None,
+                            verifier=None, url_checks=None):
+    brnum = row.get(brnum_col, 'Unknown')
+    try:
+        brnum = row[brnum_col]
+
+        # All attempts at the URL: recoverable failures are retried with backoff (see RetryPolicy.call)
+        # and a downloaded PDF is registered in the content store (a file reused after a 304 already is)
+        async def fetch_with_retries(url):
+            tries = 0
+            while True:
+                tries += 1
+                started = time.monotonic()
+                with run_metrics.stage("validate"):
+                    status, reason, details = await fetch_pdf_async(session, url, brnum, download_folder,
+                                                                    **download_options)
+                run_metrics.request(url, time.monotonic() - started, reason)
+                if not retry_policy.should_retry(reason, tries):
+                    break
+                await asyncio.sleep(retry_policy.delay(tries))
+            if status == "Downloaded" and content_store is not None and not details.get("not_modified"):
+                details["object_path"] = content_store.adopt(details["file_path"], details["sha256"])
+            return status, reason, details, tries
+
+        # Validate and download with one request per URL, falling back to the alternative column
+        status, reason, details, attempts = None, NO_URL, {}, 0
+        for url in candidate_urls(row, primary_col, alternative_col):
+            if url_checks is not None and url_checks.skip(url):
+                reason = url_checks.reason(url)  # Prevalidation found it dead or not a PDF: no request
+                continue
+            if url_tasks is None:
+                status, reason, details, tries = await fetch_with_retries(url)
+            else:
+                # Rows sharing a URL await the same fetch
+                task = url_tasks.get(url)
+                owner = task is None
+                if owner:
+                    task = asyncio.ensure_future(fetch_with_retries(url))
+                    url_tasks[url] = task
+                status, reason, details, tries = await task
+                if not owner:
+                    tries = 0  # Fetched for another BRnum in this run
+                    if status == "Downloaded":
+                        details = content_store.share(details, os.path.join(download_folder,
+                                                                             pdf_file_name(url, brnum)))
+            attempts += tries
+            if status is not None:
+                break
+        if status is None:
+            status = "Not downloaded"
+            logger.info("No valid URL found for BRnum %s (%s)", brnum, reason, extra={"brnum": brnum, "reason": reason})
+        run_metrics.annotate(reason=reason, attempts=attempts)
+
+        # The metadata writer thread writes the workbook; the journal append (and its fsync) runs in a worker thread
+        with run_metrics.stage("metadata"):
+            await asyncio.to_thread(metadata_writer.submit, brnum, status, status_detail=reason, attempts=attempts,
+                                    sha256=details.get("sha256"))
+        if status == "Downloaded" and verifier is not None:
+            verifier.submit(brnum, details["file_path"], url)  # Checked in another process, off the event loop
+
+    except KeyError as e:
+        logger.error("Key error processing row %s: %s", row.name, e)
+        status = "KeyError"
+
+    except Exception as e:
+        logger.error("Error processing BRnum %s: %s", brnum, e)
+        status = "Processing Error"
+
+    return brnum, status
+
+
+# Function to map an aiohttp/asyncio exception to a failure reason (see retry_policy.classify_exception)
+def classify_async_exception(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return TIMED_OUT
+    if isinstance(error, aiohttp.ClientConnectionError):
+        return CONNECTION_ERROR
+    if isinstance(error, aiohttp.ClientError):
+        return REQUEST_ERROR
+    return DISK_ERROR
+
+
+async def fetch_pdf_async(session, url, brnum, download_folder, chunk_size=CHUNK_SIZE,
+                          max_file_size=MAX_FILE_SIZE, timeout=TIMEOUT, http_cache=None, resume=True):
+    """
+    asyncio version of download_pdf.fetch_pdf: one streaming GET that validates the
+    response and saves the PDF through a ".part" file, resuming it with a Range request if possible
+    (unless `resume` is False). URLs found in `http_cache` are requested conditionally (a 304 reuses
+    the earlier file). Blocking file operations run in worker threads.
+
+    Returns:
+        tuple: (status, reason, details), as returned by download_pdf.fetch_pdf.
+    """
+    new_file_name = pdf_file_name(url, brnum)
+    file_path = os.path.join(download_folder, new_file_name)
+    offset, headers = await asyncio.to_thread(load_resume_state, file_path, url) if resume else (0, {})
+    cached = http_cache.lookup(url) if http_cache is not None and not offset else None
+    if cached is not None:
+        headers = HttpCache.conditional_headers(cached)
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+    body_started = False  # Errors before the body count as "not a valid URL", after as a failed download
+
+    try:
+        async with session.get(url, headers=headers, timeout=client_timeout, allow_redirects=True) as response:
+            if response.status == 416 and offset:
+                # The saved part no longer matches the remote file: drop it and download from scratch, once
+                await asyncio.to_thread(clear_resume_state, file_path)
+                return await fetch_pdf_async(session, url, brnum, download_folder, chunk_size, max_file_size, timeout,
+                                             http_cache, resume=False)
+            if response.status == 304 and cached is not None:
+                return await asyncio.to_thread(reuse_cached_pdf, url, cached, file_path, http_cache)
+            if response.status not in (200, 206):
+                return None, classify_status(response.status), {}
+            if response.headers.get('Content-Type', '').lower().startswith('text/html'):
+                return None, NOT_PDF, {}  # Report page, not a PDF: stop before reading the body
+
+            # 206 continues the ".part" file, 200 means the server ignored the Range
+            if offset and response.status == 206:
+                if not response.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+                    await asyncio.to_thread(clear_resume_state, file_path)
+                    return "Not downloaded", REQUEST_ERROR, {}
+            else:
+                offset = 0
+
+            check_content_length(response, max_file_size, offset)
+
+            first_chunk = await response.content.read(chunk_size)
+            head = first_chunk
+            if offset:
+                head = await asyncio.to_thread(_read_head, file_path + PART_SUFFIX)
+            if not is_pdf_response(response, head):
+                return None, NOT_PDF, {}
+
+            body_started = True
+            resumable = await asyncio.to_thread(save_resume_state, file_path, url, response)
+            hasher = hashlib.sha256()
+            with run_metrics.stage("download"):
+                size = await _save_response(response, first_chunk, file_path, chunk_size, max_file_size, offset,
+                                            resumable, hasher)
+            run_metrics.add_bytes(size - offset)
+
+    except FileTooLargeError as e:
+        logger.warning("Failed to download PDF from %s: %s", url, e, extra={"url": url, "brnum": brnum})
+        return "Not downloaded", TOO_LARGE, {}
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        logger.warning("Failed to download PDF from %s: %r", url, e, extra={"url": url, "brnum": brnum})
+        return ("Not downloaded" if body_started else None), classify_async_exception(e), {}
+
+    sha256 = hasher.hexdigest()
+    if http_cache is not None:
+        http_cache.record(url, response.headers, file_path, size, sha256)
+    logger.debug("Downloaded: %s", new_file_name)
+    return "Downloaded", OK, {"file_path": file_path, "bytes": size, "sha256": sha256}
+
+
+# Function to read the first bytes of a ".part" file, to check the PDF header of a resumed download
+def _read_head(part_path):
+    with open(part_path, 'rb') as part_file:
+        return part_file.read(len(PDF_MAGIC))
+
+
+# Function to open the ".part" file for writing from `offset` (the resumed bytes are kept)
+def _open_part_file(part_path, offset):
+    part_file = open(part_path, 'ab' if offset else 'wb')
+    part_file.truncate(offset)
+    return part_file
+
+
+# Coroutine to stream the body into the ".part" file and rename it once complete (see save_stream).
+# The file operations run in worker threads so a slow disk does not stall the other downloads.
+async def _save_response(response, first_chunk, file_path, chunk_size, max_file_size, offset, keep_partial,
+                         hasher):
+    part_path = file_path + PART_SUFFIX
+    size = offset
+    write_time = 0.0  # Time spent in file writes, reported as the "disk_write" stage
+    try:
+        if offset:
+            await asyncio.to_thread(hash_part_file, part_path, offset, hasher)
+        part_file = await asyncio.to_thread(_open_part_file, part_path, offset)
+        try:
+            chunk = first_chunk
+            while chunk:
+                size += len(chunk)
+                if max_file_size is not None and size > max_file_size:
+                    raise FileTooLargeError(f"more than {max_file_size} bytes received")
+                hasher.update(chunk)
+                started = time.perf_counter()
+                await asyncio.to_thread(part_file.write, chunk)
+                write_time += time.perf_counter() - started
+                chunk = await response.content.read(chunk_size)
+        finally:
+            await asyncio.to_thread(part_file.close)
+        started = time.perf_counter()
+        await asyncio.to_thread(os.replace, part_path, file_path)
+        write_time += time.perf_counter() - started
+        await asyncio.to_thread(clear_resume_state, file_path)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        if not keep_partial:
+            await asyncio.to_thread(clear_resume_state, file_path)
+        raise
+    except BaseException:
+        await asyncio.to_thread(clear_resume_state, file_path)
+        raise
+    finally:
+        run_metrics.add_time("disk_write", write_time)
+    return size
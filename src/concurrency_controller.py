@@ -0,0 +1,116 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 16: ADAPTIVE CONCURRENCY
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module decides how many downloads the threaded engine runs at the same time.
+# It performs the following tasks:
+# 1. Records the outcome of every request: duration, bytes received and failure reason.
+# 2. Every few requests, computes throughput (bytes/s), latency percentiles and the error rate.
+# 3. Adds workers while requests stay healthy and throughput keeps up, and halves them on errors,
+#    timeouts or a latency jump (AIMD: additive increase, multiplicative decrease), within min/max bounds.
+# This finds a good level of concurrency for the link and the remote servers without manual tuning.
+
+# concurrency_controller.py
+
+import threading
+import time
+
+from retry_policy import RETRYABLE_REASONS
+
+# Requests observed before each adjustment
+SAMPLE_SIZE = 20
+
+
+# Function to get the p-th percentile (0-100) of a list of values
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller of the number of rows processed at the same time.
+
+    Args:
+        min_workers (int): Lowest concurrency.
+        max_workers (int): Highest concurrency (size of the thread pool).
+        initial (int): Starting concurrency, `min_workers` by default.
+        increase (int): Workers added after a healthy sample.
+        decrease_factor (float): Factor applied to the concurrency after an unhealthy sample.
+        error_threshold (float): Share of overload failures (timeouts, connection errors, 429, 5xx)
+            above which a sample is unhealthy.
+        latency_factor (float): A sample is unhealthy when its p90 latency exceeds this many times
+            the best p90 latency seen so far.
+        throughput_tolerance (float): After an increase, the added worker is taken back if the
+            throughput (bytes/s) fell by more than this share.
+        sample_size (int): Requests observed before each adjustment.
+    """
+
+    def __init__(self, min_workers=4, max_workers=64, initial=None, increase=1, decrease_factor=0.5,
+                 error_threshold=0.1, latency_factor=3.0, throughput_tolerance=0.2, sample_size=SAMPLE_SIZE):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.limit = min(self.max_workers, max(self.min_workers, initial or self.min_workers))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.error_threshold = error_threshold
+        self.latency_factor = latency_factor
+        self.throughput_tolerance = throughput_tolerance
+        self.sample_size = sample_size
+        self.best_latency = None
+        self.last_sample = {}
+        self._increased = False
+        self._lock = threading.Lock()
+        self._reset_sample()
+
+    def _reset_sample(self):
+        self._latencies = []
+        self._errors = 0
+        self._bytes = 0
+        self._started = time.monotonic()
+
+    def record(self, reason, elapsed, nbytes=0):
+        """
+        Records one request and adjusts the concurrency once a sample is complete.
+
+        Args:
+            reason (str): Failure reason of the request (retry_policy constants, "ok" on success).
+            elapsed (float): Duration of the request, in seconds.
+            nbytes (int): Bytes received.
+        """
+        with self._lock:
+            self._latencies.append(elapsed)
+            self._bytes += nbytes
+            if reason in RETRYABLE_REASONS:
+                self._errors += 1
+            if len(self._latencies) >= self.sample_size:
+                self._adjust()
+
+    def _adjust(self):
+        # Called with the lock held, once per sample
+        duration = max(time.monotonic() - self._started, 1e-6)
+        throughput = self._bytes / duration
+        error_rate = self._errors / len(self._latencies)
+        p50, p90 = percentile(self._latencies, 50), percentile(self._latencies, 90)
+        slow = self.best_latency is not None and p90 > self.latency_factor * self.best_latency
+        previous = self.last_sample.get("throughput")
+        if error_rate > self.error_threshold or slow:
+            self.limit = max(self.min_workers, int(self.limit * self.decrease_factor))
+            self._increased = False
+        elif self._increased and previous and throughput < previous * (1 - self.throughput_tolerance):
+            # More workers did not help: the link or the servers are saturated
+            self.limit = max(self.min_workers, self.limit - self.increase)
+            self._increased = False
+        else:
+            new_limit = min(self.max_workers, self.limit + self.increase)
+            self._increased = new_limit > self.limit
+            self.limit = new_limit
+        if error_rate <= self.error_threshold:
+            self.best_latency = p90 if self.best_latency is None else min(self.best_latency, p90)
+        self.last_sample = {"throughput": throughput, "p50": p50, "p90": p90,
+                            "error_rate": error_rate, "limit": self.limit}
+        self._reset_sample()
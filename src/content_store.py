@@ -0,0 +1,138 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 14: CONTENT-ADDRESSED STORE
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module removes duplicate downloads and duplicate files across BRnums.
+# It performs the following tasks:
+# 1. Fetches each distinct URL only once per run; other rows with that URL reuse the result.
+# 2. Stores each distinct PDF once under its SHA-256 in "<download_folder>/.store/".
+# 3. Materializes the BRnum-prefixed files as hard links (or symlinks/copies) to the stored PDF.
+# This cuts network transfer and disk usage when many rows point to the same report.
+
+# content_store.py
+
+import os
+import shutil
+import threading
+
+# Folder (inside the download folder) holding one file per distinct PDF content
+STORE_DIR = ".store"
+
+
+# Function to create (or replace) `file_path` as a hard link to `source_path`, else a symlink, else a copy
+def link_or_copy(source_path, file_path):
+    if os.path.exists(file_path) and os.path.samefile(source_path, file_path):
+        return  # Already a link to it
+    temp_path = f"{file_path}.link"
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(source_path), temp_path)
+        except OSError:
+            shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, file_path)
+    # Renaming a link over another link to the same file does nothing: the temporary link stays
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+
+
+class ContentStore:
+    """
+    SHA-256 addressed store of downloaded PDFs.
+
+    Args:
+        download_folder (str): Folder where the BRnum-prefixed PDFs are saved.
+    """
+
+    def __init__(self, download_folder):
+        self.root = os.path.join(download_folder, STORE_DIR)
+
+    def object_path(self, sha256):
+        # Objects are spread over 256 sub-folders to keep directories small
+        return os.path.join(self.root, sha256[:2], f"{sha256}.pdf")
+
+    def adopt(self, file_path, sha256):
+        """
+        Registers a freshly downloaded file in the store. If the same bytes are already
+        stored, the file is replaced by a link to the stored copy.
+
+        Returns:
+            str: Path of the stored object, or None if the file system supports no links
+            (the file is then left as it is).
+        """
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            os.link(file_path, object_path)  # First copy: the store shares the file's inode
+            return object_path
+        except FileExistsError:
+            pass
+        except OSError:
+            return None
+        self.materialize(object_path, file_path)
+        return object_path
+
+    def materialize(self, object_path, file_path):
+        # Create (or replace) `file_path` as a link to the stored object
+        link_or_copy(object_path, file_path)
+
+    def share(self, details, file_path):
+        """
+        Gives `file_path` the content of a PDF that was downloaded for another BRnum.
+
+        Args:
+            details (dict): The details returned by fetch_pdf for the original download
+                ("file_path", and "object_path" once adopted by the store).
+            file_path (str): The BRnum-prefixed path to create.
+
+        Returns:
+            dict: The same details, pointing at `file_path`.
+        """
+        self.materialize(details.get("object_path") or details["file_path"], file_path)
+        return dict(details, file_path=file_path)
+
+
+class UrlCache:
+    """
+    Runs the fetch of each distinct URL once per run. Threads asking for a URL that is
+    being fetched wait for that fetch and get its result.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def run(self, url, fetch):
+        """
+        Returns:
+            tuple: (result, owner). `result` is what `fetch()` returned for this URL and
+            `owner` is True for the caller that actually ran it.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            owner = entry is None
+            if owner:
+                entry = {"done": threading.Event(), "result": None}
+                self._entries[url] = entry
+
+        if not owner:
+            entry["done"].wait()
+            if entry["result"] is None:
+                return self.run(url, fetch)  # The owner's fetch raised: try it ourselves
+            return entry["result"], False
+
+        try:
+            entry["result"] = fetch()
+        except BaseException:
+            # Let the next caller try again instead of waiting forever
+            with self._lock:
+                del self._entries[url]
+            raise
+        finally:
+            entry["done"].set()
+        return entry["result"], True
@@ -7,35 +7,353 @@
 # This module is responsible for downloading PDF files from validated URLs.
 # It performs the following tasks:
 # 1. Makes HTTP requests to download the PDF file from the given URL.
-# 2. Saves the downloaded file to the specified directory with a BRnum-prefixed filename.
+# 2. Streams the file in chunks to a ".part" file and renames it to its BRnum-prefixed name
+#    once complete, so memory stays flat and no truncated PDF is left under its final name.
 # 3. Returns the download status ("Downloaded" or "Not downloaded").
+# 4. Offers a single-request path that validates and downloads from the same streaming response.
+# 5. Keeps interrupted ".part" files (with their ETag/Last-Modified) and resumes them with
+#    HTTP Range requests on the next attempt.
+# 6. Reports why a download failed (timeout, HTTP 4xx/5xx, not a PDF, too large) for the retry policy.
+# 7. Revalidates previously downloaded URLs with If-None-Match/If-Modified-Since (304 = reuse the file).
+# 8. Reports download and disk-write time and bytes received to run_metrics, and logs instead of printing.
 # It ensures that the PDF files are downloaded reliably while handling potential errors.
 
 # download_pdf.py
 
 import requests
 from pathlib import Path
+import hashlib
+import json
+import logging
 import os
+import time
 
-# Function to download a PDF and save it with a BRnum prefix
-def download_pdf(url, brnum, download_folder):
+from http_session import get_session
+from retry_policy import OK, NOT_PDF, TOO_LARGE, REQUEST_ERROR, classify_exception, classify_status
+from http_cache import HttpCache
+from content_store import link_or_copy
+import run_metrics
+
+logger = logging.getLogger(__name__)
+
+# Size of the blocks read from a streaming response
+CHUNK_SIZE = 64 * 1024
+
+# Maximum accepted size of a PDF in bytes (None for no limit)
+MAX_FILE_SIZE = None
+
+# Seconds to wait for the server to connect or send data
+TIMEOUT = 10
+
+# Suffix of the temporary file a download is streamed into
+PART_SUFFIX = ".part"
+
+# Suffix of the file holding the validators of an interrupted ".part" download
+STATE_SUFFIX = ".json"
+
+# Every PDF file starts with this header
+PDF_MAGIC = b"%PDF"
+
+
+# Raised when a response is bigger than the configured maximum file size
+class FileTooLargeError(Exception):
+    pass
+
+
+# Function to build the BRnum-prefixed file name for a URL
+def pdf_file_name(url, brnum):
+    # Extract original PDF file name from URL
+    original_name = url.split('/')[-1]
+    # Construct the new file name with BRnum prefix
+    return f"{brnum}_{original_name}"
+
+
+# Function to reject a response early when its announced size is over the limit
+def check_content_length(response, max_file_size, offset=0):
+    if max_file_size is None:
+        return
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit() and offset + int(content_length) > max_file_size:
+        raise FileTooLargeError(f"{offset + int(content_length)} bytes announced, limit is {max_file_size}")
+
+
+def load_resume_state(file_path, url):
+    """
+    Looks for an interrupted download of `file_path` that can be resumed.
+
+    Returns:
+        tuple: (offset, headers). `offset` is the size of the ".part" file and `headers`
+        the Range/If-Range headers to send, or (0, {}) when there is nothing to resume.
+    """
+    part_path = file_path + PART_SUFFIX
+    state_path = part_path + STATE_SUFFIX
+    if not (os.path.exists(part_path) and os.path.exists(state_path)):
+        return 0, {}
+    try:
+        with open(state_path, 'r', encoding='utf-8') as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return 0, {}
+
+    validator = state.get('etag') or state.get('last_modified')
+    offset = os.path.getsize(part_path)
+    if state.get('url') != url or not validator or offset == 0:
+        return 0, {}
+    # If-Range makes the server send the full file instead if it changed since
+    return offset, {'Range': f'bytes={offset}-', 'If-Range': validator}
+
+
+# Function to remember the validators of a download so it can be resumed if interrupted
+def save_resume_state(file_path, url, response):
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if not etag and not last_modified:
+        return False  # Without a validator a partial file cannot be resumed safely
+    state = {'url': url, 'etag': etag, 'last_modified': last_modified}
+    with open(file_path + PART_SUFFIX + STATE_SUFFIX, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    return True
+
+
+# Function to remove the ".part" file of a download and its saved state
+def clear_resume_state(file_path):
+    part_path = file_path + PART_SUFFIX
+    for path in (part_path, part_path + STATE_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Function to find where the body of a response starts in the file
+def response_offset(response, offset):
+    # 206 with the expected Content-Range: the server continues the ".part" file
+    if offset and response.status_code == 206:
+        if response.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+            return offset
+        return None  # Range not honoured as asked
+    # 200: the server ignored the Range (or the file changed), start again from byte zero
+    return 0
+
+
+# Function to hash the bytes already in the ".part" file of a resumed download
+def hash_part_file(part_path, offset, hasher):
+    with open(part_path, 'rb') as part_file:
+        remaining = offset
+        while remaining > 0:
+            block = part_file.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+
+
+def save_stream(chunks, file_path, max_file_size=MAX_FILE_SIZE, offset=0, keep_partial=False, hasher=None):
+    """
+    Writes an iterable of byte chunks to `file_path` through a ".part" temporary file.
+
+    The temporary file is renamed to `file_path` only once every chunk is written. On a
+    network error it is kept if `keep_partial` is set (so the download can be resumed),
+    otherwise it is removed, as it is for any other failure.
+
+    Args:
+        offset (int): Number of bytes already in the ".part" file; the chunks are appended after them.
+        hasher: Optional hashlib object updated with the whole file content while it is written.
+
+    Returns:
+        int: Size of the complete file in bytes.
+    """
+    part_path = file_path + PART_SUFFIX
+    size = offset
+    write_time = 0.0  # Time spent in file writes, reported as the "disk_write" stage
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise error for bad responses
+        if offset and hasher is not None:
+            hash_part_file(part_path, offset, hasher)
+        with open(part_path, 'ab' if offset else 'wb') as part_file:
+            part_file.truncate(offset)
+            for chunk in chunks:
+                size += len(chunk)
+                if max_file_size is not None and size > max_file_size:
+                    raise FileTooLargeError(f"more than {max_file_size} bytes received")
+                if hasher is not None:
+                    hasher.update(chunk)
+                started = time.perf_counter()
+                part_file.write(chunk)
+                write_time += time.perf_counter() - started
+        started = time.perf_counter()
+        os.replace(part_path, file_path)
+        write_time += time.perf_counter() - started
+        clear_resume_state(file_path)
+    except requests.RequestException:
+        if not keep_partial:
+            clear_resume_state(file_path)
+        raise
+    except BaseException:
+        clear_resume_state(file_path)
+        raise
+    finally:
+        run_metrics.add_time("disk_write", write_time)
+    return size
 
-        # Extract original PDF file name from URL
-        original_name = url.split('/')[-1]
-        # Construct the new file name with BRnum prefix
-        new_file_name = f"{brnum}_{original_name}"
+
+# Function to download a PDF and save it with a BRnum prefix
+def download_pdf(url, brnum, download_folder, chunk_size=CHUNK_SIZE, max_file_size=MAX_FILE_SIZE,
+                 timeout=TIMEOUT, session=None):
+    session = session or get_session()  # Pooled keep-alive connections
+    try:
+        new_file_name = pdf_file_name(url, brnum)
         file_path = os.path.join(download_folder, new_file_name)
+        offset, headers = load_resume_state(file_path, url)
+
+        response = session.get(url, stream=True, timeout=timeout, headers=headers)
+        try:
+            if response.status_code == 416:
+                clear_resume_state(file_path)  # The saved part no longer matches the remote file
+            response.raise_for_status()  # Raise error for bad responses
+            offset = response_offset(response, offset)
+            if offset is None:
+                clear_resume_state(file_path)
+                raise requests.RequestException(f"Unexpected Content-Range for {url}")
+            check_content_length(response, max_file_size, offset)
+            resumable = save_resume_state(file_path, url, response)
 
-        # Save the PDF to the designated folder
-        with open(file_path, 'wb') as pdf_file:
-            pdf_file.write(response.content)
-        
-        print(f"Downloaded: {new_file_name}")
+            # Stream the PDF to the designated folder
+            save_stream(response.iter_content(chunk_size=chunk_size), file_path, max_file_size,
+                        offset, keep_partial=resumable)
+        finally:
+            response.close()
+
+        logger.debug("Downloaded: %s", new_file_name)
         return "Downloaded"
-    
-    except requests.RequestException as e:
-        print(f"Failed to download PDF from {url}: {e}")
+
+    except (requests.RequestException, OSError, FileTooLargeError) as e:
+        logger.warning("Failed to download PDF from %s: %s", url, e, extra={"url": url, "brnum": brnum})
         return "Not downloaded"
+
+
+# Function to decide from the headers and the first bytes whether a response is a PDF
+def is_pdf_response(response, first_chunk):
+    content_type = response.headers.get('Content-Type', '').lower()
+    return content_type.startswith('application/pdf') or first_chunk.startswith(PDF_MAGIC)
+
+
+# Function to read the first bytes of the ".part" file of a resumed download
+def _part_head(file_path):
+    with open(file_path + PART_SUFFIX, 'rb') as part_file:
+        return part_file.read(len(PDF_MAGIC))
+
+
+def fetch_pdf(url, brnum, download_folder, chunk_size=CHUNK_SIZE, max_file_size=MAX_FILE_SIZE,
+              timeout=TIMEOUT, session=None, http_cache=None, resume=True):
+    """
+    Validates and downloads a PDF with a single streaming GET request.
+
+    The status code and Content-Type are checked as soon as the headers arrive, and the
+    first chunk is checked for the PDF header. HTML pages are abandoned before their body
+    is read; PDFs are streamed straight to disk from the same response. An interrupted
+    download is resumed from its ".part" file when the server supports Range requests.
+    A URL found in the HTTP cache is requested conditionally, and a 304 answer reuses the
+    file downloaded before.
+
+    Args:
+        url (str): The URL to fetch.
+        brnum (str): The unique identifier used as file name prefix (e.g., "BR50001").
+        download_folder (str): Folder where the PDF is saved.
+        chunk_size (int): Size of the blocks read from the response.
+        max_file_size (int): Maximum accepted size in bytes, or None for no limit.
+        timeout (float): Seconds to wait for the server to connect or send data.
+        session (requests.Session): Session to use, the shared pooled session by default.
+        http_cache (HttpCache): Optional index of earlier downloads used for conditional requests.
+        resume (bool): Whether to resume an interrupted download from its ".part" file.
+
+    Returns:
+        tuple: (status, reason, details). `status` is "Downloaded" or "Not downloaded", or
+        None if the URL does not serve a PDF (the caller can then try another URL). `reason`
+        is one of the failure reasons of retry_policy ("ok" on success). `details` holds the
+        "file_path", "bytes" and "sha256" of a downloaded file, and "not_modified" when it
+        was reused after a 304 answer (empty otherwise).
+    """
+    session = session or get_session()  # Pooled keep-alive connections
+    new_file_name = pdf_file_name(url, brnum)
+    file_path = os.path.join(download_folder, new_file_name)
+    offset, headers = load_resume_state(file_path, url) if resume else (0, {})
+    cached = http_cache.lookup(url) if http_cache is not None and not offset else None
+    if cached is not None:
+        headers = HttpCache.conditional_headers(cached)
+
+    try:
+        response = session.get(url, stream=True, allow_redirects=True, timeout=timeout, headers=headers)
+    except requests.RequestException as e:
+        logger.info("URL not reachable %s: %s", url, e, extra={"url": url, "brnum": brnum})
+        return None, classify_exception(e), {}
+
+    with response:
+        if response.status_code == 416 and offset:
+            # The saved part no longer matches the remote file: drop it and download from scratch, once
+            clear_resume_state(file_path)
+            return fetch_pdf(url, brnum, download_folder, chunk_size, max_file_size, timeout, session, http_cache,
+                             resume=False)
+        if response.status_code == 304 and cached is not None:
+            return reuse_cached_pdf(url, cached, file_path, http_cache)
+        if response.status_code not in (200, 206):
+            return None, classify_status(response.status_code), {}
+        if response.headers.get('Content-Type', '').lower().startswith('text/html'):
+            return None, NOT_PDF, {}  # Report page, not a PDF: stop before reading the body
+
+        try:
+            offset = response_offset(response, offset)
+            if offset is None:
+                clear_resume_state(file_path)
+                return "Not downloaded", REQUEST_ERROR, {}
+            check_content_length(response, max_file_size, offset)
+            chunks = response.iter_content(chunk_size=chunk_size)
+            first_chunk = next(chunks, b"")
+            if not is_pdf_response(response, _part_head(file_path) if offset else first_chunk):
+                return None, NOT_PDF, {}
+
+            if offset:
+                logger.info("Resuming %s from byte %d", new_file_name, offset)
+            resumable = save_resume_state(file_path, url, response)
+            hasher = hashlib.sha256()
+            with run_metrics.stage("download"):
+                size = save_stream(_prepend(first_chunk, chunks), file_path, max_file_size, offset,
+                                   keep_partial=resumable, hasher=hasher)
+            run_metrics.add_bytes(size - offset)
+
+        except FileTooLargeError as e:
+            logger.warning("Failed to download PDF from %s: %s", url, e, extra={"url": url, "brnum": brnum})
+            return "Not downloaded", TOO_LARGE, {}
+        except (requests.RequestException, OSError) as e:
+            logger.warning("Failed to download PDF from %s: %s", url, e, extra={"url": url, "brnum": brnum})
+            return "Not downloaded", classify_exception(e), {}
+
+    sha256 = hasher.hexdigest()
+    if http_cache is not None:
+        http_cache.record(url, response.headers, file_path, size, sha256)
+    logger.debug("Downloaded: %s", new_file_name)
+    return "Downloaded", OK, {"file_path": file_path, "bytes": size, "sha256": sha256}
+
+
+# Function to reuse the file of an unchanged URL (304 Not Modified) for this BRnum
+def reuse_cached_pdf(url, cached, file_path, http_cache):
+    try:
+        if not (os.path.exists(file_path) and os.path.samefile(cached["path"], file_path)):
+            link_or_copy(cached["path"], file_path)
+    except OSError as e:
+        logger.warning("Failed to reuse cached PDF %s: %s", cached["path"], e)
+        return "Not downloaded", classify_exception(e), {}
+    http_cache.touch(url)
+    logger.debug("Not modified since last run: %s", os.path.basename(file_path))
+    return "Downloaded", OK, {"file_path": file_path, "bytes": cached["size"], "sha256": cached.get("sha256"),
+                              "not_modified": True}
+
+
+# Function to validate and download a PDF, returning only the status (see fetch_pdf)
+def fetch_valid_pdf(url, brnum, download_folder, chunk_size=CHUNK_SIZE, max_file_size=MAX_FILE_SIZE,
+                    timeout=TIMEOUT, session=None):
+    status, _, _ = fetch_pdf(url, brnum, download_folder, chunk_size, max_file_size, timeout, session)
+    return status
+
+
+# Function to yield an already-read chunk followed by the rest of the stream
+def _prepend(first_chunk, chunks):
+    yield first_chunk
+    yield from chunks
@@ -0,0 +1,171 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 12: PER-HOST SCHEDULER
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module keeps the downloader polite towards each remote host.
+# It performs the following tasks:
+# 1. Reorders the rows so consecutive work items target different hosts (round-robin).
+# 2. Limits the number of concurrent requests per host.
+# 3. Limits the request rate per host with a token bucket.
+# 4. Pauses a host when it answers 429/503 with a Retry-After header.
+# This keeps the overall throughput high without tripping remote throttling.
+
+# host_scheduler.py
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Longest pause accepted from a Retry-After header, in seconds
+MAX_RETRY_AFTER = 300
+
+# Status codes whose Retry-After header is honoured
+THROTTLE_STATUSES = (429, 503)
+
+
+# Function to get the host name of a URL ("" when it has none)
+def host_of(url):
+    if not isinstance(url, str):
+        return ""
+    try:
+        return (urlsplit(url.strip()).hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+# Function to convert a Retry-After header (seconds or HTTP date) into seconds to wait
+def parse_retry_after(value):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def interleave_by_host(df, url_col):
+    """
+    Reorders the rows round-robin across hosts: the first row of every host, then the
+    second row of every host, and so on. Hosts keep their spreadsheet order.
+
+    Args:
+        df (pd.DataFrame): Source rows.
+        url_col (str): Column holding the URL the host is taken from.
+
+    Returns:
+        pd.DataFrame: The same rows (and index) in interleaved order.
+    """
+    hosts = df[url_col].map(host_of)
+    rank = hosts.groupby(hosts, sort=False).cumcount()
+    order = rank.sort_values(kind="stable").index
+    return df.loc[order]
+
+
+class _HostState:
+    """
+    Concurrency slots and token bucket of one host.
+    """
+
+    def __init__(self, max_per_host, rate, burst):
+        self.slots = threading.BoundedSemaphore(max_per_host)
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # Take one token (going into debt if needed) and return the seconds to wait before using it
+        with self.lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.rate:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = -self.tokens / self.rate
+            return max(wait, self.not_before - now)
+
+
+class HostScheduler:
+    """
+    Per-host politeness rules applied around each request.
+
+    Args:
+        max_per_host (int): Maximum number of concurrent requests to one host.
+        rate_per_host (float): Maximum requests per second to one host, or None for no limit.
+        burst (int): Number of requests a host may receive back to back before the rate applies.
+    """
+
+    def __init__(self, max_per_host=4, rate_per_host=None, burst=1):
+        self.max_per_host = max_per_host
+        self.rate_per_host = rate_per_host
+        self.burst = max(1, burst)
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()  # URL of the slot held by the current thread
+
+    def _state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = _HostState(self.max_per_host, self.rate_per_host, self.burst)
+                self._hosts[host] = state
+            return state
+
+    @contextmanager
+    def slot(self, url):
+        # Wait for a free connection slot and a rate token for the URL's host
+        state = self._state(host_of(url))
+        with state.slots:
+            wait = state.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            previous, self._local.url = getattr(self._local, "url", None), url
+            try:
+                yield
+            finally:
+                self._local.url = previous
+
+    def retry_after(self, url, seconds):
+        # Hold back every request to the URL's host for `seconds`
+        state = self._state(host_of(url))
+        seconds = min(seconds, MAX_RETRY_AFTER)
+        with state.lock:
+            state.not_before = max(state.not_before, time.monotonic() + seconds)
+        logger.warning("Host %s asked to slow down, pausing it for %.0fs", host_of(url), seconds,
+                       extra={"host": host_of(url)})
+
+    def requested_url(self, response):
+        # URL the request was scheduled under: after a redirect, response.url belongs to another host.
+        # requests runs the hooks before attaching the history, so the URL of the current slot comes next.
+        if response.history:
+            return response.history[0].url
+        return getattr(self._local, "url", None) or response.url
+
+    def response_hook(self, response, *args, **kwargs):
+        """
+        `requests` response hook: honours Retry-After on 429/503 answers, pausing the host
+        the request was scheduled for (not the host it was redirected to).
+        """
+        if response.status_code in THROTTLE_STATUSES:
+            seconds = parse_retry_after(response.headers.get("Retry-After"))
+            if seconds:
+                self.retry_after(self.requested_url(response), seconds)
+        return response
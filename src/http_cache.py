@@ -0,0 +1,133 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 15: CONDITIONAL REVALIDATION CACHE
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module remembers, across runs, what was downloaded from each URL.
+# It performs the following tasks:
+# 1. Keeps a persistent index: URL -> ETag, Last-Modified, size, local path, fetch time.
+# 2. Provides If-None-Match / If-Modified-Since headers for URLs fetched before.
+# 3. Evicts entries older than a TTL, and the oldest entries above a maximum count.
+# 4. Saves the index atomically at the end of a run.
+# This lets an unchanged report cost a "304 Not Modified" answer instead of a full download.
+
+# http_cache.py
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Entries older than this are dropped (seconds)
+TTL = 30 * 24 * 3600
+
+# Maximum number of URLs kept in the index
+MAX_ENTRIES = 100_000
+
+
+class HttpCache:
+    """
+    Persistent URL index used for conditional requests.
+
+    Args:
+        index_path (str): JSON file holding the index (created on first save).
+        ttl (float): Seconds after which an entry is no longer used, or None to keep entries forever.
+        max_entries (int): Maximum number of entries; the least recently fetched are dropped first.
+    """
+
+    def __init__(self, index_path, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.index_path = index_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                entries = json.load(index_file)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable HTTP cache index %s: %s", self.index_path, e)
+            return {}
+        logger.info("HTTP cache index loaded. Entries: %d", len(entries))
+        return entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, url):
+        """
+        Returns the entry of a URL if it is recent enough and its file still exists, else None.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None:
+            return None
+        if self.ttl is not None and time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        if not os.path.exists(entry["path"]):
+            return None
+        return entry
+
+    # Function to build the conditional request headers for a cache entry
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url, response_headers, path, size, sha256=None):
+        # Remember the validators of a completed download (only useful if the server sent some)
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        entry = {"etag": etag, "last_modified": last_modified, "path": path, "size": size,
+                 "sha256": sha256, "fetched_at": time.time()}
+        with self._lock:
+            self._entries.pop(url, None)  # Re-insert so dict order stays oldest-first
+            self._entries[url] = entry
+
+    def touch(self, url):
+        # The server confirmed the entry (304): restart its TTL
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                entry["fetched_at"] = time.time()
+                self._entries[url] = entry
+
+    def forget(self, url):
+        # Drop the entry of a URL whose file turned out to be unusable, so it is fetched in full again
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def evict(self):
+        # Drop expired entries, then the oldest ones above the maximum count
+        with self._lock:
+            if self.ttl is not None:
+                oldest_allowed = time.time() - self.ttl
+                self._entries = {url: entry for url, entry in self._entries.items()
+                                 if entry["fetched_at"] >= oldest_allowed}
+            excess = len(self._entries) - self.max_entries
+            if excess > 0:
+                for url in list(self._entries)[:excess]:
+                    del self._entries[url]
+
+    def save(self):
+        # Write the index atomically (temp file + rename)
+        self.evict()
+        with self._lock:
+            data = json.dumps(self._entries)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            index_file.write(data)
+        os.replace(temp_path, self.index_path)
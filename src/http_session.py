@@ -0,0 +1,86 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 10: HTTP SESSION
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module provides the HTTP session shared by the URL validator and the PDF downloader.
+# It performs the following tasks:
+# 1. Creates one `requests.Session` with a tuned `HTTPAdapter` connection pool.
+# 2. Keeps connections alive so repeated requests to the same host skip the TCP/TLS handshake.
+# 3. Caps the number of open connections per host (extra requests wait for a free connection).
+# This removes the connection set-up cost from every request to the same corporate/IR hosts.
+
+# http_session.py
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Number of hosts whose connection pools are kept open
+POOL_CONNECTIONS = 100
+
+# Maximum number of open connections per host
+POOL_MAXSIZE = 10
+
+# Wait for a free connection instead of opening more than POOL_MAXSIZE per host
+POOL_BLOCK = True
+
+_settings = {
+    "pool_connections": POOL_CONNECTIONS,
+    "pool_maxsize": POOL_MAXSIZE,
+    "pool_block": POOL_BLOCK,
+}
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure_sessions(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK):
+    """
+    Sets the connection pool sizes and drops the current session so the next call to
+    get_session() builds a new one with these settings.
+
+    Args:
+        pool_connections (int): Number of hosts whose connection pools are kept open.
+        pool_maxsize (int): Maximum number of open connections per host.
+        pool_block (bool): Wait for a free connection when a host's pool is full.
+    """
+    global _session
+    with _session_lock:
+        _settings.update(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+# Function to build a session with pooled, keep-alive connections for http and https
+def create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=_settings["pool_connections"],
+        pool_maxsize=_settings["pool_maxsize"],
+        pool_block=_settings["pool_block"],
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Function to get the session shared by all worker threads (created on first use)
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def close_session():
+    # Close the pooled connections at the end of a run
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -9,22 +9,101 @@
 # 1. Opens the specified Excel file.
 # 2. Returns the content as a pandas DataFrame for further processing.
 # 3. Handles errors such as missing or corrupt files.
+# 4. Reads only the needed columns, with the fastest installed engine (calamine if available).
+# 5. Caches the parsed DataFrame on disk (Parquet, or pickle without pyarrow), keyed by the
+#    file's path, size and modification time, so an unchanged workbook is not parsed again.
 # This ensures that the source data is correctly loaded and ready for processing.
 
 # load_excel.py
 
+import hashlib
+import importlib.util
+import logging
+import os
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
+# Fastest available Excel engine: calamine (Rust) if installed, else pandas' default (openpyxl)
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+# Columnar cache format: Parquet needs pyarrow, pickle is always available
+CACHE_FORMAT = "parquet" if importlib.util.find_spec("pyarrow") else "pickle"
+
+
+# Function to build the cache file path of a workbook (changes whenever the file or the columns change)
+def cache_file_path(excel_file_path, cache_dir, columns=None):
+    stat = os.stat(excel_file_path)
+    key = f"{os.path.abspath(excel_file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{sorted(columns or [])}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(excel_file_path))[0]
+    extension = "parquet" if CACHE_FORMAT == "parquet" else "pkl"
+    return os.path.join(cache_dir, f"{stem}.{digest}.{extension}")
+
+
+# Function to read a cached DataFrame (None if missing or unreadable)
+def read_cache(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+    except Exception as e:
+        logger.warning("Ignoring unreadable cache %s: %s", path, e)
+        return None
+
+
+# Function to write the cache atomically, removing the caches of older versions of the workbook
+def write_cache(data, path):
+    cache_dir, stem = os.path.dirname(path), os.path.basename(path).rsplit(".", 2)[0]
+    temp_path = f"{path}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if path.endswith(".parquet"):
+            data.to_parquet(temp_path, index=False)
+        else:
+            data.to_pickle(temp_path)
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.warning("Could not cache the Excel data to %s: %s", path, e)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+    for name in os.listdir(cache_dir):
+        if name.rsplit(".", 2)[0] == stem and name != os.path.basename(path):
+            os.remove(os.path.join(cache_dir, name))
+
+
 # Function to load Excel file data
-def load_excel(excel_file_path):
-    # Opens the Excel file and returns a DataFrame.
+def load_excel(excel_file_path, columns=None, cache_dir=None):
+    """
+    Opens the Excel file and returns a DataFrame.
+
+    Args:
+        excel_file_path (str): Path of the workbook.
+        columns (list): Columns to read (missing ones are ignored), or None for all columns.
+        cache_dir (str): Folder of the parsed-data cache, or None to always parse the workbook.
+
+    Returns:
+        pd.DataFrame: The data, or None if the file could not be read.
+    """
     try:
-        data = pd.read_excel(excel_file_path)
-        print("Excel file opened successfully.")
+        cache_path = cache_file_path(excel_file_path, cache_dir, columns) if cache_dir else None
+        if cache_path:
+            data = read_cache(cache_path)
+            if data is not None:
+                logger.info("Excel data loaded from cache.")
+                return data
+
+        wanted = set(columns) if columns else None
+        data = pd.read_excel(excel_file_path, engine=EXCEL_ENGINE,
+                             usecols=(lambda column: column in wanted) if wanted else None)
+        logger.info("Excel file opened successfully.")
+        if cache_path:
+            write_cache(data, cache_path)
         return data
     except FileNotFoundError:
-        print("Error: The file was not found.")
+        logger.error("The file was not found: %s", excel_file_path)
         return None
     except Exception as e:
-        print(f"An error occurred while opening the file: {e}")
+        logger.error("An error occurred while opening the file: %s", e)
         return None
@@ -20,56 +20,297 @@ from validate_urls import get_valid_url
 from download_pdf import download_pdf
 from update_metadata import update_metadata
 from threaded_executor import run_threaded_execution
+from async_executor import run_async_execution
+from metadata_writer import compact_journal
+from resume import completed_brnums, filter_pending, filter_reasons
+from http_session import configure_sessions, close_session
+from host_scheduler import HostScheduler
+from retry_policy import RetryPolicy
+from http_cache import HttpCache
+from concurrency_controller import AdaptiveConcurrency
+from run_metrics import RunMetrics, configure_logging
+from shard_runner import select_shard, shard_path, run_shards, merge_shards
+from reconcile import reconcile, write_report, apply_fixes
+from url_prevalidator import prevalidate
+import argparse
 import pandas as pd
+from collections import Counter
 
 # Define paths and column names for the files and data we'll process
 excel_file_path = '../data/GRI_2017_2020.xlsx'
 metadata_file_path = '../metadata/Metadata2024.xlsx'
+journal_file_path = '../metadata/Metadata2024.journal.jsonl'
 download_folder = '../downloads'
 primary_col = 'Pdf_URL'
 alternative_col = 'Report Html Address'
 brnum_col = 'BRnum'
 
-# Function to validate metadata consistency
-def validate_metadata(source_file_path, metadata_file_path, brnum_col):
+# Source loading: only these columns are parsed, and the parsed data is cached in this folder
+# (keyed by the workbook's size and modification time) so an unchanged workbook loads instantly
+source_columns = [brnum_col, primary_col, alternative_col]
+excel_cache_dir = '../data/.cache'
+
+# Batched metadata writer: write the workbook every N updates or T seconds (and at the end)
+metadata_flush_every = 500
+metadata_flush_interval = 30.0
+
+# Streaming downloads: block size read from the network, size limit per PDF (None for no limit)
+# and seconds to wait for a slow server (interrupted downloads are resumed on the next run)
+download_options = {
+    "chunk_size": 64 * 1024,
+    "max_file_size": 500 * 1024 * 1024,
+    "timeout": 10,
+}
+
+# Shared HTTP session: number of hosts kept in the pool and open connections per host
+http_pool_options = {
+    "pool_connections": 100,
+    "pool_maxsize": 10,
+}
+
+# Per-host politeness (threaded engine): concurrent requests and requests/second per host,
+# rows interleaved across hosts, Retry-After honoured. Set to None to disable.
+host_limits = {
+    "max_per_host": 4,
+    "rate_per_host": 2.0,
+    "burst": 4,
+}
+
+# Retries of recoverable failures (timeouts, connection errors, 5xx, 429) with exponential backoff
+# and jitter: attempts per URL, first delay and longest delay in seconds, retries for the whole run
+retry_options = {
+    "max_attempts": 3,
+    "base_delay": 1.0,
+    "max_delay": 30.0,
+    "run_budget": 1000,
+}
+
+# Deduplication: fetch each distinct URL once per run and store identical PDFs once
+# ("downloads/.store/", with the BRnum-prefixed files as hard links)
+deduplicate = True
+
+# Verification of each downloaded file in worker processes: "%PDF" header, "%%EOF" trailer and page count
+# (with PyPDF2), recorded with the size and hash in the metadata. Files that fail are marked "Not downloaded"
+# ("truncated_pdf", "corrupt_pdf", ... in status_detail). Processes: None for one per CPU.
+verify_pdfs = True
+verify_processes = None
+
+# Conditional revalidation across runs: URLs downloaded before are requested with If-None-Match /
+# If-Modified-Since, and a "304 Not Modified" reuses the existing file. Set the path to None to disable.
+http_cache_path = '../metadata/http_cache.json'
+http_cache_ttl_days = 30  # Entries older than this are fetched again in full
+http_cache_max_entries = 100_000
+
+# Execution engine: "threaded" (ThreadPoolExecutor) or "async" (asyncio + aiohttp, optional dependency)
+engine = "threaded"
+max_workers = None  # Threads of the threaded engine (None: Python's default for the CPU count)
+async_max_concurrency = 200  # Downloads kept in flight by the async engine
+
+# Adaptive concurrency (threaded engine): the number of rows in flight grows while requests stay fast
+# and error-free, and is halved on timeouts/errors/latency jumps, between these bounds. Set to None
+# to use a fixed max_workers instead.
+adaptive_concurrency = {
+    "min_workers": 4,
+    "max_workers": 64,
+}
+
+# URL prevalidation: before the downloads, probe each distinct URL of the sheet once (HEAD, or a Range GET
+# of its first bytes), after normalizing them (spaces, case, default ports, fragments, http/https).
+# Rows then skip URLs found dead (4xx) or not PDFs without requesting them. Worth it when many rows share
+# URLs or point at report pages; timeouts and 5xx found here are still tried by the engine.
+prevalidate_urls = False
+prevalidate_options = {
+    "max_workers": 32,  # Probes at the same time (within the per-host limits)
+    "timeout": 5,
+}
+
+# Incremental mode: skip BRnums already downloaded (metadata says so and the file exists)
+incremental = True
+verify_existing_files = False  # Also check size / PDF header of each existing file
+
+# Targeted rerun: only process rows whose last failure is one of these classes ("status_detail"
+# column of the metadata), e.g. {"timeout", "connection_error", "http_5xx"}. None processes every row.
+rerun_reasons = None
+
+# Logging and run report: log level ("DEBUG" logs every row), one JSON object per log line or plain text,
+# JSON summary of the run (throughput, stage timings, per-host latencies, statuses) and per-row CSV
+# timings. Set a report path to None to skip it.
+log_level = "INFO"
+json_logs = False
+run_report_path = '../metadata/run_report.json'
+row_timings_path = '../metadata/run_rows.csv'
+
+# Sharded runs: with shard_count > 1, rows are split by a hash of their BRnum ("brnum") or of their
+# URL's host ("host") over that many processes, each with its own metadata shard and journal, and the
+# shards are merged into metadata_file_path at the end. See the entry point for multi-machine runs.
+shard_count = 1
+shard_by = "brnum"
+max_shard_processes = None  # Processes running at once (None: one per shard)
+
+# Final reconciliation of the source sheet, the metadata and the download folder: the differences
+# (missing BRnums, duplicates, stale statuses, rows without a file, files without a row) are written to
+# this report (None to skip it), and with reconcile_fix the metadata statuses are corrected in one write.
+reconcile_report_path = '../metadata/reconcile_report.xlsx'
+reconcile_fix = False
+
+# Function to validate metadata consistency: one merged pass over the source, the metadata and the
+# download folder (see reconcile.py), reported in reconcile_report_path and fixed if reconcile_fix is set
+def validate_metadata(source_file_path, metadata_file_path, brnum_col, source_df=None):
     try:
-        # Load source data and metadata
-        source_df = pd.read_excel(source_file_path)
-        metadata_df = pd.read_excel(metadata_file_path)
-
-        # Extract BRnum lists
-        source_brnums = set(source_df[brnum_col].dropna().unique())
-        metadata_brnums = set(metadata_df["BRnum"].dropna().unique())
-
-        # Check for missing BRnum entries
-        missing_brnums = source_brnums - metadata_brnums
-        if missing_brnums:
-            print(f"Warning: The following BRnum entries are missing in the metadata file: {missing_brnums}")
+        # Load source data (unless already loaded by main)
+        if source_df is None:
+            source_df = pd.read_excel(source_file_path, usecols=[brnum_col])
+        issues = reconcile(source_df, metadata_file_path, download_folder, brnum_col)
+
+        # Check for missing BRnum entries and the other differences
+        missing_brnums = issues["missing_in_metadata"].index
+        if len(missing_brnums):
+            print(f"Warning: {len(missing_brnums)} BRnum entries are missing in the metadata file, "
+                  f"e.g. {list(missing_brnums[:10])}")
         else:
             print("Validation successful: All BRnum entries are accounted for in the metadata file.")
+        print("Reconciliation: " + ", ".join(f"{name}={len(rows)}" for name, rows in issues.items()))
+        if reconcile_report_path:
+            write_report(issues, reconcile_report_path)
+            print(f"Reconciliation report written to {reconcile_report_path}.")
+        if reconcile_fix:
+            fixed = apply_fixes(issues, metadata_file_path)
+            print(f"Reconciliation fixed {fixed} metadata entries.")
     except Exception as e:
         print(f"Error during metadata validation: {e}")
 
-def main():
+# Function to run steps 0 to 2 (and the run report) for the whole sheet, or for one shard of it
+def run_rows(shard_index=None, shard_count=1):
+    configure_logging(log_level, json_logs)
+    # In sharded mode every shard has its own metadata file, journal, HTTP cache and reports
+    shard_metadata_path = shard_path(metadata_file_path, shard_index, shard_count)
+    shard_journal_path = shard_path(journal_file_path, shard_index, shard_count)
+    shard_report_path = shard_path(run_report_path, shard_index, shard_count)
+    metrics = RunMetrics(shard_path(row_timings_path, shard_index, shard_count))
+
+    # Step 0: Recover the statuses of an interrupted run from the journal
+    replayed = compact_journal(shard_metadata_path, shard_journal_path)
+    if replayed:
+        print(f"Recovered {replayed} status updates from the journal of a previous run.")
+
     # Step 1: Load Excel data
     print("Loading Excel data...")
-    df = load_excel(excel_file_path)
-    if df is None:
+    source_df = load_excel(excel_file_path, source_columns, excel_cache_dir)
+    if source_df is None:
         exit("Failed to load the Excel file.")
     print("Excel data loaded successfully.")
-    
-    # Step 2: Start threaded execution for URL validation and PDF downloading
-    print("Starting threaded execution for URL validation and downloading...")
-    results = run_threaded_execution(df, download_folder, metadata_file_path, primary_col, alternative_col, brnum_col)
-    print(f"Threaded execution completed with results: {results}")
+    df = source_df
+    if shard_index is not None:
+        df = select_shard(df, shard_index, shard_count, brnum_col, primary_col, shard_by)
+        print(f"Shard {shard_index} of {shard_count}: {len(df)} rows.")
+
+    # Step 1b: In incremental mode, drop rows that are already complete before any network I/O
+    if incremental:
+        completed = completed_brnums(metadata_file_path, download_folder, verify_existing_files)
+        if shard_metadata_path != metadata_file_path:
+            completed |= completed_brnums(shard_metadata_path, download_folder, verify_existing_files)
+        df = filter_pending(df, brnum_col, completed)
+        print(f"Incremental mode: {len(completed)} BRnums already downloaded, {len(df)} rows left to process.")
+    if rerun_reasons:
+        df = filter_reasons(df, brnum_col, metadata_file_path, rerun_reasons)
+        print(f"Targeted rerun of {sorted(rerun_reasons)}: {len(df)} rows to process.")
+
+    # Step 1c: Probe each distinct URL once, so rows skip the URLs known to be dead or not PDFs
+    configure_sessions(**http_pool_options)
+    scheduler = HostScheduler(**host_limits) if host_limits else None
+    url_checks = None
+    if prevalidate_urls:
+        print("Prevalidating URLs...")
+        url_checks = prevalidate(df, primary_col, alternative_col, scheduler=scheduler, **prevalidate_options)
+        print(f"Prevalidation results: {dict(url_checks.counts())}")
+        if engine == "async":
+            close_session()  # The async engine has its own connections
+
+    # Step 2: Start threaded (or asyncio) execution for URL validation and PDF downloading
+    # Results are tallied per status as rows finish instead of being kept in memory
+    status_counts = Counter()
+
+    def count_result(result):
+        status_counts[result[1]] += 1
+
+    http_cache = (HttpCache(shard_path(http_cache_path, shard_index, shard_count),
+                            http_cache_ttl_days * 24 * 3600, http_cache_max_entries)
+                  if http_cache_path else None)
+    if engine == "async":
+        print("Starting asyncio execution for URL validation and downloading...")
+        run_async_execution(df, download_folder, shard_metadata_path, primary_col, alternative_col,
+                            brnum_col, metadata_flush_every, metadata_flush_interval, shard_journal_path,
+                            download_options, async_max_concurrency, http_pool_options["pool_maxsize"],
+                            RetryPolicy(**retry_options), deduplicate, http_cache,
+                            result_sink=count_result, metrics=metrics, verify_pdfs=verify_pdfs,
+                            verify_processes=verify_processes, url_checks=url_checks)
+    else:
+        print("Starting threaded execution for URL validation and downloading...")
+        concurrency = AdaptiveConcurrency(**adaptive_concurrency) if adaptive_concurrency else None
+        try:
+            run_threaded_execution(df, download_folder, shard_metadata_path, primary_col, alternative_col,
+                                   brnum_col, metadata_flush_every, metadata_flush_interval,
+                                   shard_journal_path, download_options, scheduler,
+                                   RetryPolicy(**retry_options), deduplicate, http_cache,
+                                   max_workers, result_sink=count_result, concurrency=concurrency,
+                                   metrics=metrics, verify_pdfs=verify_pdfs, verify_processes=verify_processes,
+                                   url_checks=url_checks)
+        finally:
+            close_session()
+    print(f"{engine.capitalize()} execution completed with results: {dict(status_counts)}")
+
+    # Run report of this process
+    if shard_report_path:
+        report = metrics.write_report(shard_report_path)
+        print(f"Run report written to {shard_report_path}: {report['rows']} rows in {report['elapsed_seconds']} s "
+              f"({report['rows_per_second']} rows/s, {report['megabytes_per_second']} MB/s).")
+    else:
+        metrics.close()
+    # The loaded sheet is reused by step 3 (not sent back from shard processes)
+    return source_df if shard_index is None else None
+
+
+def main():
+    if shard_count > 1:
+        # Steps 0 to 2 in one process per shard, then merge the metadata shards (step 2b)
+        print(f"Starting a sharded run over {shard_count} processes (by {shard_by})...")
+        run_shards(run_rows, shard_count, max_shard_processes)
+        merge_shards(metadata_file_path, shard_count, journal_file_path)
+        source_df = load_excel(excel_file_path, source_columns, excel_cache_dir)  # Cached by the shards
+    else:
+        source_df = run_rows()
 
     # Step 3: Validate that all BRnum entries are accounted for in the metadata file
     print("Validating metadata file...")
-    validate_metadata(excel_file_path, metadata_file_path, brnum_col)
+    validate_metadata(excel_file_path, metadata_file_path, brnum_col, source_df)
     print("Validation completed.")
 
 # Entry point for the script
+# "python main.py --shard 3 --shards 8" runs only shard 3 of 8 (e.g. one shard per machine sharing
+# the folders), and "python main.py --merge --shards 8" merges the shards once they are all done.
+# "python main.py --reconcile --fix" only audits (and fixes) the metadata against the sheet and the downloads.
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF downloader")
+    parser.add_argument("--shard", type=int, help="Run only this shard (0 to --shards - 1)")
+    parser.add_argument("--shards", type=int, default=shard_count, help="Number of shards")
+    parser.add_argument("--merge", action="store_true", help="Merge the metadata shards and validate")
+    parser.add_argument("--reconcile", action="store_true", help="Only reconcile the metadata (no downloads)")
+    parser.add_argument("--fix", action="store_true", help="Apply the reconciliation fixes to the metadata")
+    args = parser.parse_args()
+
+    reconcile_fix = reconcile_fix or args.fix
+    configure_logging(log_level, json_logs)
     print("Starting the main process.")
-    main()
+    if args.reconcile:
+        validate_metadata(excel_file_path, metadata_file_path, brnum_col,
+                          load_excel(excel_file_path, source_columns, excel_cache_dir))
+    elif args.merge:
+        merge_shards(metadata_file_path, args.shards, journal_file_path)
+        validate_metadata(excel_file_path, metadata_file_path, brnum_col,
+                          load_excel(excel_file_path, source_columns, excel_cache_dir))
+    elif args.shard is not None:
+        run_rows(args.shard, args.shards)
+    else:
+        shard_count = args.shards
+        main()
     print("Process completed.")
@@ -0,0 +1,261 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 7: BATCHED METADATA WRITER
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module keeps the metadata status table in memory and writes it to disk in batches.
+# It performs the following tasks:
+# 1. Loads the existing metadata file once into a dictionary keyed by BRnum.
+# 2. Accepts status updates from the worker threads through a queue (O(1) per row).
+# 3. Flushes the table to the Excel file every N updates / T seconds, and on shutdown.
+# 4. Optionally records every update in a status journal and replays it on startup.
+# This replaces the per-row read/sort/rewrite of the workbook done by update_metadata.
+
+# metadata_writer.py
+
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from update_metadata import metadata_lock
+from status_journal import StatusJournal
+
+logger = logging.getLogger(__name__)
+
+# Columns always present in the metadata file, in this order
+BASE_COLUMNS = ["BRnum", "pdf_downloaded"]
+
+# Sentinel put on the queue to stop the writer thread
+_STOP = object()
+
+
+class MetadataWriter:
+    """
+    Write-behind store for the metadata file.
+
+    Worker threads call submit() which only enqueues the update. A single
+    background thread applies updates to the in-memory table and writes the
+    workbook every `flush_every` updates or `flush_interval` seconds, and once
+    more when the writer is closed.
+
+    Args:
+        metadata_file_path (str): Path to the metadata Excel file.
+        flush_every (int): Number of updates between two writes of the workbook.
+        flush_interval (float): Maximum number of seconds between two writes.
+        journal_path (str): Optional path of the status journal. Updates are appended to it
+            as they are submitted, replayed on startup, and discarded once written to the workbook.
+        fsync_interval (float): Seconds between two fsync calls on the journal.
+    """
+
+    def __init__(self, metadata_file_path, flush_every=500, flush_interval=30.0,
+                 journal_path=None, fsync_interval=1.0):
+        self.metadata_file_path = metadata_file_path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.columns = list(BASE_COLUMNS)
+        self.table = self._load()
+        self.flush_count = 0
+
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._thread = None
+        self._stopping = False
+
+        self.journal = None
+        if journal_path is not None:
+            self.journal = StatusJournal(journal_path, fsync_interval)
+            self._replay()
+
+    # Function to load the existing metadata file into a dict keyed by BRnum
+    def _load(self):
+        if not os.path.exists(self.metadata_file_path):
+            logger.info("Metadata file does not exist. A new one will be created.")
+            return {}
+
+        metadata_df = pd.read_excel(self.metadata_file_path, engine="openpyxl")
+        for column in metadata_df.columns:
+            if column not in self.columns:
+                self.columns.append(column)
+
+        table = {}
+        for record in metadata_df.to_dict("records"):
+            if pd.notna(record.get("BRnum")):
+                table[record["BRnum"]] = record
+        logger.info("Metadata file loaded. Existing entries: %d", len(table))
+        return table
+
+    # Function to re-apply the updates of a previous run that never reached the workbook
+    def _replay(self):
+        records = self.journal.replay()
+        for brnum, fields in records:
+            self._apply(brnum, fields)
+        if records:
+            logger.info("Replayed %d journal entries from %s", len(records), self.journal.journal_path)
+
+    def start(self):
+        # Start the background writer thread (daemon, so it never blocks interpreter exit)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metadata-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, brnum, status=None, **fields):
+        """
+        Queue a status update for a BRnum. Safe to call from any thread.
+
+        Args:
+            brnum (str): The unique identifier for the PDF file (e.g., "BR50001").
+            status (str): The value for the "pdf_downloaded" column, or None to keep it.
+            **fields: Extra metadata columns to set for this BRnum.
+        """
+        if status is not None:
+            fields["pdf_downloaded"] = status
+        if self.journal is None:
+            self._queue.put((brnum, fields))
+            return
+        # Journal first, then queue, under one lock so flush() can mark a consistent offset
+        with self.journal.lock:
+            self.journal.append(brnum, fields)
+            self._queue.put((brnum, fields))
+
+    def close(self):
+        # Stop the writer thread after it has drained the queue, then write the final state
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        else:
+            self._drain()
+        if self._pending:
+            self.flush()
+        if self.journal is not None:
+            self.journal.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # Function to apply one update to the in-memory table
+    def _apply(self, brnum, fields):
+        record = self.table.get(brnum)
+        if record is None:
+            record = {"BRnum": brnum, "pdf_downloaded": None}
+            self.table[brnum] = record
+        for column, value in fields.items():
+            if column not in self.columns:
+                self.columns.append(column)
+            record[column] = value
+        self._pending += 1
+
+    # Function to apply every update currently waiting in the queue (without blocking)
+    def _drain(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is _STOP:
+                self._stopping = True
+            else:
+                self._apply(*item)
+
+    def _flush_due(self):
+        if self._pending == 0:
+            return False
+        if self._pending >= self.flush_every:
+            return True
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    # Background loop: apply updates as they arrive and flush in batches
+    def _run(self):
+        while not self._stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._stopping = True
+            elif item is not None:
+                self._apply(*item)
+
+            if self._stopping:
+                break
+            if self._flush_due():
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error("Error writing metadata file: %s", e)
+        self._drain()
+
+    def to_dataframe(self):
+        # Build the sorted metadata DataFrame from the in-memory table
+        metadata_df = pd.DataFrame.from_records(list(self.table.values()), columns=self.columns)
+        return metadata_df.sort_values(by="BRnum").reset_index(drop=True)
+
+    def flush(self):
+        """
+        Write the in-memory table to the metadata file, then compact the journal.
+        Holds the module-level metadata lock so legacy update_metadata calls cannot interleave.
+        """
+        journal_mark = None
+        if self.journal is not None:
+            # Everything journaled before the mark is either applied or still queued: apply it now
+            with self.journal.lock:
+                journal_mark = self.journal.tell()
+                self._drain()
+        metadata_df = self.to_dataframe()
+        with metadata_lock:
+            write_excel_atomic(metadata_df, self.metadata_file_path)
+        if journal_mark is not None:
+            self.journal.discard_until(journal_mark)
+        self.flush_count += 1
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        logger.info("Metadata file written (%d entries, flush #%d).", len(metadata_df), self.flush_count)
+
+
+# Function to write a DataFrame to an Excel file atomically (temp file + rename)
+def write_excel_atomic(df, file_path):
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=".~", suffix=".xlsx", dir=directory)
+    os.close(fd)
+    try:
+        with pd.ExcelWriter(temp_path, engine="openpyxl", mode="w") as writer:
+            df.to_excel(writer, index=False)
+        with open(temp_path, "rb") as temp_file:
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def compact_journal(metadata_file_path, journal_path):
+    """
+    Replay a status journal left by an interrupted run into the metadata file.
+
+    Args:
+        metadata_file_path (str): Path to the metadata Excel file.
+        journal_path (str): Path to the status journal.
+
+    Returns:
+        int: Number of journal entries that were materialized into the workbook.
+    """
+    if not os.path.exists(journal_path) or os.path.getsize(journal_path) == 0:
+        return 0
+    writer = MetadataWriter(metadata_file_path, journal_path=journal_path)
+    replayed = writer._pending
+    writer.close()
+    return replayed
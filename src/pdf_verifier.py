@@ -0,0 +1,176 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 19: PDF VERIFICATION
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module checks every downloaded PDF once it is on disk, away from the network threads.
+# It performs the following tasks:
+# 1. Checks the "%PDF" header and the "%%EOF" trailer of the file (truncated downloads have no trailer).
+# 2. Opens the file with PyPDF2 to count its pages (when PyPDF2 is installed).
+# 3. Hashes the file and measures its size as stored on disk.
+# 4. Runs these checks in a pool of worker processes and records the results in the metadata,
+#    marking files that fail as "Not downloaded" with the reason in "status_detail".
+# 5. Deletes a file that fails and drops its URL from the HTTP cache, so the next run downloads it again.
+# Downstream jobs can then rely on the metadata instead of reopening every file.
+# PyPDF2 is optional: without it, only the header, trailer, size and hash are checked.
+
+# pdf_verifier.py
+
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:  # Optional dependency, only needed for the page count
+    PdfReader = None
+
+from download_pdf import PDF_MAGIC
+from retry_policy import OK, NOT_PDF, DISK_ERROR, TRUNCATED_PDF, CORRUPT_PDF
+
+logger = logging.getLogger(__name__)
+
+# End-of-file marker, searched for in the last bytes of the file (writers may append whitespace after it)
+PDF_TRAILER = b"%%EOF"
+TRAILER_WINDOW = 1024
+
+# Block size used to hash the file
+READ_SIZE = 1024 * 1024
+
+
+# Function to check one PDF file (runs in a worker process)
+def verify_pdf(file_path, count_pages=True):
+    """
+    Args:
+        file_path (str): Path of the downloaded PDF.
+        count_pages (bool): Open the file with PyPDF2 to count its pages.
+
+    Returns:
+        dict: "reason" (OK, NOT_PDF, TRUNCATED_PDF, CORRUPT_PDF or DISK_ERROR), "bytes", "sha256"
+            and "pages" (None when not counted).
+    """
+    result = {"reason": OK, "bytes": None, "sha256": None, "pages": None}
+    hasher = hashlib.sha256()
+    try:
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as pdf_file:
+            head = pdf_file.read(len(PDF_MAGIC))
+            pdf_file.seek(0)
+            for block in iter(lambda: pdf_file.read(READ_SIZE), b""):
+                hasher.update(block)
+            pdf_file.seek(max(0, size - TRAILER_WINDOW))
+            tail = pdf_file.read()
+    except OSError:
+        result["reason"] = DISK_ERROR
+        return result
+    result["bytes"], result["sha256"] = size, hasher.hexdigest()
+
+    if not head.startswith(PDF_MAGIC):
+        result["reason"] = NOT_PDF
+    elif PDF_TRAILER not in tail:
+        result["reason"] = TRUNCATED_PDF
+    elif count_pages and PdfReader is not None:
+        try:
+            reader = PdfReader(file_path, strict=False)
+            if not reader.is_encrypted:  # Pages of encrypted files cannot be read without the password
+                result["pages"] = len(reader.pages)
+        except Exception:
+            result["reason"] = CORRUPT_PDF
+    return result
+
+
+class PdfVerifier:
+    """
+    Verifies downloaded PDFs in worker processes and records the results in the metadata.
+
+    submit() only queues the file, so network threads never wait for a check. Results are
+    sent to the metadata writer as they arrive: "pages", "bytes", "sha256" and "verified".
+    A file that fails is marked "Not downloaded" with the reason in "status_detail", deleted, and
+    its URL dropped from the HTTP cache (otherwise a "304 Not Modified" would bring the bad file back).
+
+    Args:
+        metadata_writer (MetadataWriter): Writer receiving the results.
+        max_processes (int): Worker processes (None: one per CPU).
+        count_pages (bool): Count the pages with PyPDF2 (ignored when PyPDF2 is not installed).
+        http_cache (HttpCache): Optional cache of the run, whose entries of failed files are dropped.
+    """
+
+    def __init__(self, metadata_writer, max_processes=None, count_pages=True, http_cache=None):
+        self.metadata_writer = metadata_writer
+        self.http_cache = http_cache
+        self.max_processes = max_processes
+        self.count_pages = count_pages and PdfReader is not None
+        self.counts = Counter()  # Results per reason
+        self._lock = threading.Lock()
+        self._executor = None
+        if count_pages and PdfReader is None:
+            logger.warning("PyPDF2 is not installed: PDFs are verified without counting their pages.")
+
+    def start(self):
+        # Fresh interpreters: no inherited threads or locks from the download threads
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(self.max_processes, mp_context=context)
+        return self
+
+    def submit(self, brnum, file_path, url=None):
+        # Queue the check of a file downloaded from `url`. Safe to call from any thread.
+        # A failed pool only costs the check: the download itself stays recorded.
+        try:
+            future = self.start()._executor.submit(verify_pdf, file_path, self.count_pages)
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.error("Could not queue the verification of %s for BRnum %s: %s", file_path, brnum, e)
+            return
+        future.add_done_callback(functools.partial(self._record, brnum, file_path, url))
+
+    # Function to send the result of one check to the metadata writer
+    def _record(self, brnum, file_path, url, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error("Error verifying %s for BRnum %s: %s", file_path, brnum, e)
+            return
+        reason = result.pop("reason")
+        with self._lock:
+            self.counts[reason] += 1
+        if reason == OK:
+            self.metadata_writer.submit(brnum, verified=True, **result)
+        else:
+            logger.warning("Downloaded file %s for BRnum %s failed verification (%s)", file_path, brnum, reason,
+                           extra={"brnum": brnum, "reason": reason})
+            self.metadata_writer.submit(brnum, "Not downloaded", status_detail=reason, verified=False, **result)
+            self._discard(file_path, url)
+
+    # Function to make a failed file be downloaded in full by the next run
+    def _discard(self, file_path, url):
+        if self.http_cache is not None and url is not None:
+            self.http_cache.forget(url)
+        try:
+            os.remove(file_path)  # Only this BRnum's link when the content store shares the file
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not delete %s after its failed verification: %s", file_path, e)
+
+    def close(self, cancel=False):
+        # Wait for the queued checks, so every result reaches the writer before it closes
+        # (or, when cancelled, only for the running ones)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=cancel)
+            self._executor = None
+        if self.counts:
+            logger.info("PDF verification: %s", dict(self.counts))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(cancel=exc_type is not None)
+        return False
@@ -0,0 +1,169 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 20: METADATA RECONCILIATION
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module audits the source sheet, the metadata file and the download folder against each other.
+# It performs the following tasks:
+# 1. Lists the download folder once and joins it with the source and metadata BRnums in one merge.
+# 2. Finds BRnums missing in the metadata, metadata rows without a source row, duplicate BRnums,
+#    rows marked downloaded without a file, stale statuses (file present but not marked downloaded)
+#    and files on disk without a source row.
+# 3. Writes the differences as an Excel report, one sheet per kind of issue.
+# 4. Optionally fixes the metadata in bulk, with a single write of the workbook.
+# Each check is a vectorized operation on the merged table, so auditing a large corpus is one pass.
+
+# reconcile.py
+
+import os
+
+import pandas as pd
+
+from metadata_writer import MetadataWriter
+from resume import iter_download_folder
+from retry_policy import OK, MISSING_FILE
+
+# Kinds of issue, in report order
+ISSUES = ("missing_in_metadata", "not_in_source", "duplicate_brnums", "downloaded_without_file",
+          "stale_status", "files_without_row")
+
+# Metadata columns carried into the merged table (when present)
+STATUS_COLUMNS = ["pdf_downloaded", "status_detail", "verified"]
+
+
+# Function to turn a BRnum into the text key the merge is done on (1001, 1001.0 and "1001" are one BRnum)
+def brnum_key(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+# Function to list the downloaded files as a DataFrame (one row per file)
+def list_downloads(download_folder):
+    return pd.DataFrame(list(iter_download_folder(download_folder)), columns=["BRnum", "file_path"])
+
+
+# Function to merge the source, metadata and file BRnums into one table indexed by BRnum
+def merge_sources(source_df, metadata_df, files_df, brnum_col="BRnum"):
+    """
+    Returns:
+        pd.DataFrame: One row per BRnum seen anywhere (indexed by its text key), with the columns
+            "brnum_value" (the BRnum as stored in the metadata, else in the source), "source_rows",
+            "metadata_rows", "file_count", "file_path" and the last metadata status columns.
+    """
+    source_values = source_df[brnum_col].dropna()
+    metadata = metadata_df.dropna(subset=["BRnum"])
+    metadata_values = metadata["BRnum"]
+    source = source_values.map(brnum_key)
+    metadata = metadata.assign(BRnum=metadata_values.map(brnum_key))
+    files = files_df.astype({"BRnum": str})
+
+    # Original BRnums, so the fixes update the metadata entries under their own keys (e.g. 1001, not "1001")
+    brnum_values = pd.Series(list(metadata_values) + list(source_values),
+                             index=list(metadata["BRnum"]) + list(source), dtype=object)
+    brnum_values = brnum_values[~brnum_values.index.duplicated()].rename("brnum_value")
+
+    source_rows = source.value_counts().rename("source_rows")
+    metadata_rows = metadata["BRnum"].value_counts().rename("metadata_rows")
+    # The metadata writer keeps the last entry of a duplicated BRnum
+    statuses = (metadata.drop_duplicates("BRnum", keep="last").set_index("BRnum")
+                .reindex(columns=STATUS_COLUMNS))
+    file_info = files.groupby("BRnum")["file_path"].agg(file_count="size", file_path="first")
+
+    table = pd.concat([brnum_values, source_rows, metadata_rows, statuses, file_info], axis=1)
+    table.index.name = "BRnum"
+    counts = ["source_rows", "metadata_rows", "file_count"]
+    table[counts] = table[counts].fillna(0).astype(int)
+    return table.sort_index()
+
+
+# Function to select the BRnums of each kind of issue from the merged table
+def find_issues(table):
+    """
+    Returns:
+        dict: Issue name (see ISSUES) -> the rows of the merged table with that issue.
+    """
+    in_source = table["source_rows"] > 0
+    in_metadata = table["metadata_rows"] > 0
+    has_file = table["file_count"] > 0
+    downloaded = table["pdf_downloaded"] == "Downloaded"
+    failed_check = table["verified"].eq(False)  # NaN: not checked
+
+    masks = {
+        "missing_in_metadata": in_source & ~in_metadata,
+        "not_in_source": in_metadata & ~in_source,
+        "duplicate_brnums": (table["source_rows"] > 1) | (table["metadata_rows"] > 1),
+        "downloaded_without_file": downloaded & ~has_file,
+        # A file that failed the PDF verification is not a stale status: it is rightly "Not downloaded"
+        "stale_status": in_metadata & ~downloaded & has_file & ~failed_check,
+        "files_without_row": has_file & ~in_source,
+    }
+    return {name: table[masks[name]] for name in ISSUES}
+
+
+def reconcile(source_df, metadata_file_path, download_folder, brnum_col="BRnum"):
+    """
+    Compares the source data, the metadata file and the download folder.
+
+    Args:
+        source_df (pd.DataFrame): The source data (only `brnum_col` is used).
+        metadata_file_path (str): Path to the metadata Excel file.
+        download_folder (str): Folder where the PDFs are saved.
+        brnum_col (str): Column holding the BRnum in the source data.
+
+    Returns:
+        dict: Issue name -> DataFrame of the BRnums with that issue (see find_issues).
+    """
+    if os.path.exists(metadata_file_path):
+        metadata_df = pd.read_excel(metadata_file_path, engine="openpyxl")
+    else:
+        metadata_df = pd.DataFrame(columns=["BRnum"])
+    table = merge_sources(source_df, metadata_df, list_downloads(download_folder), brnum_col)
+    return find_issues(table)
+
+
+# Function to write the issues as an Excel report: a summary sheet, then one sheet per non-empty issue
+def write_report(issues, report_path):
+    summary = pd.DataFrame({"issue": list(issues), "count": [len(rows) for rows in issues.values()]})
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with pd.ExcelWriter(report_path, engine="openpyxl") as writer:
+        summary.to_excel(writer, sheet_name="summary", index=False)
+        for name, rows in issues.items():
+            if len(rows):
+                rows.drop(columns="brnum_value").reset_index().to_excel(writer, sheet_name=name, index=False)
+
+
+def apply_fixes(issues, metadata_file_path):
+    """
+    Fixes the metadata file in bulk, with one write of the workbook:
+    - BRnums missing in the metadata are added ("Downloaded" when their file is on disk),
+    - stale statuses are set to "Downloaded",
+    - rows marked downloaded without a file are set to "Not downloaded" ("missing_file"),
+    - duplicate metadata rows are collapsed to their last entry.
+    Rows without a source row and files without a row are only reported.
+
+    Returns:
+        int: Number of metadata entries changed.
+    """
+    writer = MetadataWriter(metadata_file_path)
+    changed = 0
+    missing = issues["missing_in_metadata"]
+    for brnum, has_file in zip(missing["brnum_value"], missing["file_count"] > 0):
+        if has_file:
+            writer.submit(brnum, "Downloaded", status_detail=OK)
+        else:
+            writer.submit(brnum, "Not downloaded")
+        changed += 1
+    for brnum in issues["stale_status"]["brnum_value"]:
+        writer.submit(brnum, "Downloaded", status_detail=OK)
+        changed += 1
+    for brnum in issues["downloaded_without_file"]["brnum_value"]:
+        writer.submit(brnum, "Not downloaded", status_detail=MISSING_FILE)
+        changed += 1
+    # Loading the metadata already kept one entry per BRnum: writing it back removes the duplicates
+    collapsed = int((issues["duplicate_brnums"]["metadata_rows"] > 1).sum())
+    writer.close()  # Writes the workbook once, if anything was submitted
+    if collapsed and not changed:
+        writer.flush()
+    return changed + collapsed
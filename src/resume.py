@@ -0,0 +1,103 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 9: INCREMENTAL RESUME
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module decides which rows still need work before any network request is made.
+# It performs the following tasks:
+# 1. Builds a set of BRnums marked "Downloaded" in the metadata file.
+# 2. Scans the download folder once for existing BRnum-prefixed files.
+# 3. Optionally verifies each existing file (non-empty, starts with the PDF header).
+# 4. Filters the source DataFrame down to the rows that are not complete yet.
+# 5. Optionally keeps only the rows whose last failure is of given classes (e.g. timeouts).
+# This lets nightly re-runs over a mostly-unchanged spreadsheet skip everything already fetched.
+
+# resume.py
+
+import os
+
+import pandas as pd
+
+# Every PDF file starts with this header
+PDF_MAGIC = b"%PDF"
+
+
+# Function to collect the BRnums that the metadata file marks as downloaded
+def downloaded_brnums(metadata_file_path):
+    if not os.path.exists(metadata_file_path):
+        return set()
+    metadata_df = pd.read_excel(metadata_file_path, engine="openpyxl", usecols=["BRnum", "pdf_downloaded"])
+    done = metadata_df.loc[metadata_df["pdf_downloaded"] == "Downloaded", "BRnum"]
+    return set(done.dropna())
+
+
+# Function to list the downloaded files as (BRnum, path) pairs (files are saved as "{brnum}_{original_name}")
+def iter_download_folder(download_folder):
+    if not os.path.isdir(download_folder):
+        return
+    with os.scandir(download_folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or "_" not in entry.name or entry.name.startswith("."):
+                continue
+            if entry.name.endswith((".part", ".part.json", ".link")):
+                continue  # Unfinished download, its resume state, or a link being created by the content store
+            yield entry.name.split("_", 1)[0], entry.path
+
+
+# Function to index the downloaded files by BRnum
+def scan_download_folder(download_folder):
+    return dict(iter_download_folder(download_folder))
+
+
+# Function to check that a file on disk looks like a complete PDF
+def is_pdf_file(file_path):
+    try:
+        if os.path.getsize(file_path) == 0:
+            return False
+        with open(file_path, "rb") as pdf_file:
+            return pdf_file.read(len(PDF_MAGIC)) == PDF_MAGIC
+    except OSError:
+        return False
+
+
+def completed_brnums(metadata_file_path, download_folder, verify=False):
+    """
+    Build the set of BRnums that do not need to be processed again.
+
+    Args:
+        metadata_file_path (str): Path to the metadata Excel file.
+        download_folder (str): Folder where the PDFs are saved.
+        verify (bool): Also check that each file is non-empty and starts with "%PDF".
+
+    Returns:
+        set: BRnums marked "Downloaded" in the metadata that also have a file on disk.
+    """
+    on_disk = scan_download_folder(download_folder)
+    completed = {brnum for brnum in downloaded_brnums(metadata_file_path) if str(brnum) in on_disk}
+    if verify:
+        completed = {brnum for brnum in completed if is_pdf_file(on_disk[str(brnum)])}
+    return completed
+
+
+# Function to keep only the rows whose BRnum is not complete yet
+def filter_pending(df, brnum_col, completed):
+    if not completed:
+        return df
+    return df[~df[brnum_col].isin(completed)]
+
+
+# Function to collect the BRnums whose last recorded failure reason is one of `reasons`
+def brnums_with_reasons(metadata_file_path, reasons):
+    if not os.path.exists(metadata_file_path):
+        return set()
+    metadata_df = pd.read_excel(metadata_file_path, engine="openpyxl")
+    if "status_detail" not in metadata_df.columns:
+        return set()
+    selected = metadata_df.loc[metadata_df["status_detail"].isin(reasons), "BRnum"]
+    return set(selected.dropna())
+
+
+# Function to keep only the rows whose last failure reason is one of `reasons` (targeted rerun)
+def filter_reasons(df, brnum_col, metadata_file_path, reasons):
+    return df[df[brnum_col].isin(brnums_with_reasons(metadata_file_path, reasons))]
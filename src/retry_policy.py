@@ -0,0 +1,122 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 13: RETRY POLICY
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module classifies failed requests and decides which ones are worth another attempt.
+# It performs the following tasks:
+# 1. Maps exceptions and HTTP status codes to a failure reason recorded in the metadata.
+# 2. Retries only recoverable failures (timeouts, connection errors, 5xx, 429).
+# 3. Waits with exponential backoff and full jitter between attempts.
+# 4. Caps the number of attempts per URL and the number of retries for the whole run.
+# This stops permanent failures (404, HTML pages, oversized files) from wasting retries.
+
+# retry_policy.py
+
+import random
+import threading
+import time
+
+import requests
+
+# Failure reasons recorded in the "status_detail" metadata column
+OK = "ok"
+NO_URL = "no_url"
+TIMED_OUT = "timeout"
+CONNECTION_ERROR = "connection_error"
+THROTTLED = "http_429"
+HTTP_4XX = "http_4xx"
+HTTP_5XX = "http_5xx"
+NOT_PDF = "not_pdf"
+TOO_LARGE = "too_large"
+DISK_ERROR = "disk_error"
+REQUEST_ERROR = "request_error"
+TRUNCATED_PDF = "truncated_pdf"  # Set by pdf_verifier: no "%%EOF" trailer
+CORRUPT_PDF = "corrupt_pdf"  # Set by pdf_verifier: the PDF structure cannot be read
+MISSING_FILE = "missing_file"  # Set by reconcile: marked downloaded but no file on disk
+
+# Reasons that may succeed on another attempt
+RETRYABLE_REASONS = frozenset({TIMED_OUT, CONNECTION_ERROR, THROTTLED, HTTP_5XX})
+
+
+# Function to map an exception raised during a request to a failure reason
+def classify_exception(error):
+    if isinstance(error, requests.Timeout):
+        return TIMED_OUT
+    if isinstance(error, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return CONNECTION_ERROR
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return classify_status(error.response.status_code)
+    if isinstance(error, requests.RequestException):
+        return REQUEST_ERROR
+    if isinstance(error, OSError):
+        return DISK_ERROR
+    return REQUEST_ERROR
+
+
+# Function to map an unsuccessful HTTP status code to a failure reason
+def classify_status(status_code):
+    if status_code == 429:
+        return THROTTLED
+    if 500 <= status_code < 600:
+        return HTTP_5XX
+    return HTTP_4XX
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, limited per URL and per run.
+
+    Args:
+        max_attempts (int): Attempts per URL, including the first one.
+        base_delay (float): Delay before the first retry, doubled for each further retry.
+        max_delay (float): Upper bound of a single delay, in seconds.
+        run_budget (int): Maximum number of retries for the whole run, or None for no limit.
+        retryable (set): Failure reasons that are retried.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, run_budget=None,
+                 retryable=RETRYABLE_REASONS):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.run_budget = run_budget
+        self.retryable = frozenset(retryable)
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def delay(self, attempt):
+        # Full jitter: a random delay between 0 and the exponential backoff of this attempt
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def should_retry(self, reason, attempt):
+        """
+        Decides whether to try again after `attempt` attempts failed with `reason`,
+        and takes one retry from the run budget if so.
+        """
+        if reason not in self.retryable or attempt >= self.max_attempts:
+            return False
+        with self._lock:
+            if self.run_budget is not None and self.retries >= self.run_budget:
+                return False
+            self.retries += 1
+        return True
+
+    def call(self, fetch):
+        """
+        Calls `fetch()` until it succeeds, fails permanently or the budget is used up.
+
+        Args:
+            fetch (callable): Returns a tuple starting with (status, reason, ...).
+
+        Returns:
+            tuple: The tuple of the last attempt, followed by the number of attempts.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            result = fetch()
+            if not self.should_retry(result[1], attempt):
+                return (*result, attempt)
+            time.sleep(self.delay(attempt))
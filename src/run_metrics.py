@@ -0,0 +1,265 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 17: METRICS AND RUN REPORT
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module measures where the time of a run goes.
+# It performs the following tasks:
+# 1. Configures structured logging (levels, plain text or one JSON object per line).
+# 2. Times the stages of each row: validate (request and checks), download (body),
+#    disk_write and metadata, plus the bytes received.
+# 3. Keeps latency histograms per stage and per host, and counts statuses and failure reasons.
+# 4. Writes a JSON run report at the end of the run, and optionally one CSV line per row.
+# Outside a measured row the stage helpers do nothing, so runs without metrics pay almost nothing.
+
+# run_metrics.py
+
+import bisect
+import contextvars
+import csv
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from host_scheduler import host_of
+
+# Stages timed for each row (each stage's time excludes the stages nested in it)
+STAGES = ("validate", "download", "disk_write", "metadata")
+
+# Upper bounds of the latency histogram buckets, in seconds (the last bucket holds everything above)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Columns of the per-row CSV file
+ROW_FIELDS = ("brnum", "status", "reason", "attempts", "total", *STAGES, "bytes")
+
+# Standard attributes of a log record (anything else was passed with `extra=` and is logged as a field)
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# Measurements of the row being processed by the current thread / asyncio task
+_current_row = contextvars.ContextVar("current_row", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: time, level, logger, message and the `extra` fields
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# Function to set up logging for the whole program
+def configure_logging(level="INFO", json_format=False, log_file=None):
+    handler = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_format else
+                         logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of durations, cheap to update from many threads.
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th quantile (the maximum for the last bucket)
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {"count": self.count, "total": round(self.total, 6),
+                "mean": round(self.total / self.count, 6) if self.count else 0.0,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+                "max": round(self.max, 6),
+                "buckets": {label: count for label, count in zip(labels, self.counts) if count}}
+
+
+class RunMetrics:
+    """
+    Collects the timings, byte counts and outcomes of a run.
+
+    Args:
+        rows_csv_path (str): Optional CSV file receiving one line per processed row as it completes.
+    """
+
+    def __init__(self, rows_csv_path=None):
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        self.rows = 0
+        self.bytes = 0
+        self.status_counts = Counter()
+        self.reason_counts = Counter()
+        self.row_latency = LatencyHistogram()
+        self.stages = {name: LatencyHistogram() for name in STAGES}
+        self.hosts = {}
+        self._lock = threading.Lock()
+        self._csv_file = None
+        self._csv_writer = None
+        if rows_csv_path:
+            self._csv_file = open(rows_csv_path, "w", newline="", encoding="utf-8")
+            self._csv_writer = csv.DictWriter(self._csv_file, ROW_FIELDS, extrasaction="ignore")
+            self._csv_writer.writeheader()
+
+    @contextmanager
+    def row(self):
+        """
+        Measures one row: the stage helpers of this module add to the yielded record, and
+        the caller sets its "brnum" and "status".
+        """
+        record = dict.fromkeys(STAGES, 0.0)
+        record.update(brnum=None, status=None, reason=None, attempts=None, bytes=0, _stack=[], _metrics=self)
+        token = _current_row.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            _current_row.reset(token)
+            record["total"] = time.perf_counter() - started
+            self._finish(record)
+
+    def track(self, process_row):
+        # Wraps a function returning (brnum, status) so that each call is measured as one row
+        def tracked(*args, **kwargs):
+            with self.row() as record:
+                result = process_row(*args, **kwargs)
+                record["brnum"], record["status"] = result
+                return result
+        return tracked
+
+    def _finish(self, record):
+        with self._lock:
+            self.rows += 1
+            self.bytes += record["bytes"]
+            self.status_counts[record["status"]] += 1
+            self.row_latency.add(record["total"])
+            for name in STAGES:
+                if record[name]:
+                    self.stages[name].add(record[name])
+            if self._csv_writer is not None:
+                self._csv_writer.writerow({key: round(value, 6) if isinstance(value, float) else value
+                                           for key, value in record.items()})
+
+    def record_request(self, url, elapsed, reason):
+        # One HTTP request (attempt) and its outcome, for the per-host latency histograms
+        host = host_of(url)
+        with self._lock:
+            histogram = self.hosts.get(host)
+            if histogram is None:
+                histogram = self.hosts[host] = LatencyHistogram()
+            histogram.add(elapsed)
+            self.reason_counts[reason] += 1
+
+    def summary(self):
+        """
+        Returns:
+            dict: Totals, throughput, status and failure-reason counts, and the latency
+            histograms of rows, stages and hosts.
+        """
+        elapsed = time.perf_counter() - self._clock
+        with self._lock:
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "elapsed_seconds": round(elapsed, 3),
+                "rows": self.rows,
+                "rows_per_second": round(self.rows / elapsed, 3) if elapsed else 0.0,
+                "bytes": self.bytes,
+                "megabytes_per_second": round(self.bytes / 1e6 / elapsed, 3) if elapsed else 0.0,
+                "status_counts": dict(self.status_counts),
+                "reason_counts": dict(self.reason_counts),
+                "row_latency": self.row_latency.to_dict(),
+                "stages": {name: histogram.to_dict() for name, histogram in self.stages.items()},
+                "hosts": {host: histogram.to_dict() for host, histogram in sorted(self.hosts.items())},
+            }
+
+    def write_report(self, report_path):
+        # Write the JSON summary and close the per-row CSV file
+        report = self.summary()
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2, default=str)
+        self.close()
+        return report
+
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = self._csv_writer = None
+
+
+# Hot-path helpers: they only do something inside RunMetrics.row()
+
+@contextmanager
+def stage(name):
+    # Time a block as `name`; time spent in nested stages is counted there, not here
+    record = _current_row.get()
+    if record is None:
+        yield
+        return
+    stack = record["_stack"]
+    stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record[name] += elapsed - stack.pop()
+        if stack:
+            stack[-1] += elapsed
+
+
+# Function to add time measured by the caller to a stage of the current row
+def add_time(name, seconds):
+    record = _current_row.get()
+    if record is not None:
+        record[name] += seconds
+        if record["_stack"]:
+            record["_stack"][-1] += seconds
+
+
+# Function to count bytes received for the current row
+def add_bytes(nbytes):
+    record = _current_row.get()
+    if record is not None:
+        record["bytes"] += nbytes
+
+
+# Function to attach outcome fields (reason, attempts) to the current row
+def annotate(**fields):
+    record = _current_row.get()
+    if record is not None:
+        record.update(fields)
+
+
+# Function to report one HTTP request of the current row
+def request(url, elapsed, reason):
+    record = _current_row.get()
+    if record is not None:
+        metrics = record.get("_metrics")
+        if metrics is not None:
+            metrics.record_request(url, elapsed, reason)
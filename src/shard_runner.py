@@ -0,0 +1,137 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 18: SHARDED RUNS
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module splits a very large source sheet over several processes or machines.
+# It performs the following tasks:
+# 1. Assigns every row to one of N shards by a stable hash of its BRnum or of its URL's host.
+# 2. Names the metadata shard, journal and report files of each shard.
+# 3. Runs the shards in N local worker processes (or lets N invocations run one shard each).
+# 4. Merges the shard metadata files into the final metadata file and removes them.
+# Each shard has its own interpreter, metadata writer and journal, so a large run scales across cores,
+# and across machines sharing the download and metadata folders.
+
+# shard_runner.py
+
+import logging
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from host_scheduler import host_of
+from metadata_writer import MetadataWriter, compact_journal
+
+logger = logging.getLogger(__name__)
+
+# Ways to split the rows: by BRnum (even spread) or by host (each host handled by one shard,
+# so the per-host limits still hold across the whole run)
+SHARD_BY = ("brnum", "host")
+
+
+# Function to map a value to a shard number, the same in every process and on every machine
+def shard_of(value, shard_count):
+    return zlib.crc32(str(value).encode("utf-8")) % shard_count
+
+
+# Function to select the rows of one shard
+def select_shard(df, shard_index, shard_count, brnum_col, url_col, by="brnum"):
+    """
+    Args:
+        df (pd.DataFrame): The source data.
+        shard_index (int): Shard to keep, from 0 to shard_count - 1.
+        shard_count (int): Number of shards.
+        brnum_col (str): Column holding the BRnum.
+        url_col (str): Column holding the URL whose host is used when `by` is "host".
+        by (str): "brnum" or "host".
+
+    Returns:
+        pd.DataFrame: The rows of the shard, in their original order.
+    """
+    if by not in SHARD_BY:
+        raise ValueError(f"Unknown shard key {by!r}, expected one of {SHARD_BY}")
+    keys = df[brnum_col] if by == "brnum" else df[url_col].map(host_of)
+    # Hash each distinct key once (many rows share a host)
+    codes = pd.Series(keys.unique())
+    shard_by_key = dict(zip(codes, codes.map(lambda key: shard_of(key, shard_count))))
+    return df[keys.map(shard_by_key) == shard_index]
+
+
+# Function to name the file of one shard: "Metadata2024.xlsx" -> "Metadata2024.shard-2-of-8.xlsx"
+def shard_path(path, shard_index, shard_count):
+    if path is None or shard_index is None or shard_count <= 1:
+        return path
+    directory, name = os.path.split(path)
+    stem, extension = name.split(".", 1) if "." in name else (name, "")
+    shard_name = f"{stem}.shard-{shard_index}-of-{shard_count}" + (f".{extension}" if extension else "")
+    return os.path.join(directory, shard_name)
+
+
+# Function to run `run_shard(shard_index, shard_count)` for every shard, one process each
+def run_shards(run_shard, shard_count, max_processes=None):
+    """
+    Returns:
+        list: The return values of `run_shard`, in shard order.
+
+    Raises:
+        Exception: The first error of a shard, once all shards have finished.
+    """
+    context = multiprocessing.get_context("spawn")  # Fresh interpreters: no inherited threads or locks
+    with ProcessPoolExecutor(max_processes or shard_count, mp_context=context) as executor:
+        futures = [executor.submit(run_shard, shard_index, shard_count) for shard_index in range(shard_count)]
+        errors = [future.exception() for future in futures]
+    for shard_index, error in enumerate(errors):
+        if error is not None:
+            logger.error("Shard %d of %d failed: %s", shard_index, shard_count, error)
+    first_error = next((error for error in errors if error is not None), None)
+    if first_error is not None:
+        raise first_error
+    return [future.result() for future in futures]
+
+
+def merge_shards(metadata_file_path, shard_count, journal_file_path=None, remove=True):
+    """
+    Merges the shard metadata files into the final metadata file.
+
+    A shard journal left by an interrupted shard is replayed into its shard file first.
+    Shard entries override the entries already in the metadata file for the same BRnum.
+
+    Args:
+        metadata_file_path (str): Path to the final metadata Excel file.
+        shard_count (int): Number of shards of the run.
+        journal_file_path (str): Path of the (unsharded) journal, to find the shard journals.
+        remove (bool): Delete the shard files once merged.
+
+    Returns:
+        int: Number of shard entries merged.
+    """
+    shard_files = []
+    for shard_index in range(shard_count):
+        shard_metadata = shard_path(metadata_file_path, shard_index, shard_count)
+        shard_journal = shard_path(journal_file_path, shard_index, shard_count)
+        if shard_journal is not None:
+            compact_journal(shard_metadata, shard_journal)
+        if os.path.exists(shard_metadata):
+            shard_files.append((shard_metadata, shard_journal))
+
+    merged = 0
+    writer = MetadataWriter(metadata_file_path)
+    for shard_metadata, _ in shard_files:
+        for record in pd.read_excel(shard_metadata, engine="openpyxl").to_dict("records"):
+            brnum = record.pop("BRnum", None)
+            if pd.notna(brnum):
+                writer.submit(brnum, **{column: value for column, value in record.items() if pd.notna(value)})
+                merged += 1
+    writer.close()
+
+    if remove:
+        for shard_metadata, shard_journal in shard_files:
+            os.remove(shard_metadata)
+            if shard_journal is not None and os.path.exists(shard_journal):
+                os.remove(shard_journal)
+    logger.info("Merged %d entries from %d metadata shards into %s.", merged, len(shard_files), metadata_file_path)
+    return merged
@@ -0,0 +1,110 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 8: STATUS JOURNAL
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module keeps a durable, append-only record of every status change.
+# It performs the following tasks:
+# 1. Appends one JSON line per status update (BRnum + changed columns).
+# 2. Syncs the journal to disk with a cheap, time-based fsync policy.
+# 3. Replays the journal after a crash or Ctrl+C, and discards entries once they are in the workbook.
+# This ensures that a restarted run never loses the statuses recorded before it died.
+
+# status_journal.py
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Function to make numpy/pandas scalars JSON serialisable
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class StatusJournal:
+    """
+    Append-only JSONL journal of metadata updates.
+
+    Args:
+        journal_path (str): Path to the journal file (created if missing).
+        fsync_interval (float): Seconds between two fsync calls. 0 syncs every record,
+            None never syncs explicitly (the OS decides).
+    """
+
+    def __init__(self, journal_path, fsync_interval=1.0):
+        self.journal_path = journal_path
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self._file = open(journal_path, "ab")
+        self._last_fsync = time.monotonic()
+
+    def append(self, brnum, fields):
+        # Append one record; callers that need ordering with other state hold self.lock
+        line = json.dumps({"BRnum": brnum, "fields": fields}, default=_json_default)
+        self._file.write(line.encode("utf-8") + b"\n")
+        self._file.flush()
+        if self.fsync_interval is not None:
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+
+    def tell(self):
+        # Current end offset of the journal, used as a compaction mark
+        return self._file.tell()
+
+    def replay(self):
+        """
+        Read every complete record from the journal.
+
+        Returns:
+            list: (brnum, fields) tuples in the order they were written. A torn last line
+            (process killed mid-write) is ignored.
+        """
+        records = []
+        with open(self.journal_path, "rb") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning("Skipping incomplete journal line in %s", self.journal_path)
+                    continue
+                records.append((record["BRnum"], record.get("fields", {})))
+        return records
+
+    def discard_until(self, offset):
+        """
+        Drop the records before `offset` (they are now in the workbook) and keep the rest.
+        """
+        with self.lock:
+            self._file.flush()
+            with open(self.journal_path, "rb") as journal:
+                journal.seek(offset)
+                remaining = journal.read()
+
+            temp_path = f"{self.journal_path}.tmp"
+            with open(temp_path, "wb") as temp_file:
+                temp_file.write(remaining)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            self._file.close()
+            os.replace(temp_path, self.journal_path)
+            self._file = open(self.journal_path, "ab")
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
@@ -7,38 +7,126 @@
 # This module handles the parallel processing of rows from the source Excel file.
 # It performs the following tasks:
 # 1. Uses Python's `ThreadPoolExecutor` to process multiple rows concurrently.
-# 2. Validates URLs, downloads PDFs, and updates metadata for each row.
+# 2. Validates URLs, downloads PDFs, and queues metadata updates for each row.
 # 3. Collects results (BRnum and their statuses) to be returned to the main script.
+# 4. Streams rows into a bounded window of in-flight futures, and results to an optional sink,
+#    so memory stays flat however large the sheet is.
+# 5. Optionally sizes that window at runtime with an adaptive concurrency controller.
+# 6. Optionally measures each row (stage timings, bytes, per-host latency) with run_metrics.
+# 7. Optionally hands each downloaded file to the PDF verifier's worker processes.
+# 8. Optionally skips URLs that the prevalidation stage found dead or not PDFs.
 # It ensures that the program efficiently handles large datasets by leveraging threading.
 
 # threaded_executor.py
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from validate_urls import get_valid_url
-from download_pdf import download_pdf
+import logging
+import os
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from validate_urls import candidate_urls
+from download_pdf import fetch_pdf, pdf_file_name
 from update_metadata import update_metadata
+from metadata_writer import MetadataWriter
+from http_session import get_session
+from host_scheduler import interleave_by_host
+from retry_policy import RetryPolicy, NO_URL
+from content_store import ContentStore, UrlCache
+from pdf_verifier import PdfVerifier
+import run_metrics
+
+logger = logging.getLogger(__name__)
+
+# Rows submitted ahead of the running ones, per worker thread
+IN_FLIGHT_PER_WORKER = 2
 
 # Function to manage threaded execution for each row
-def run_threaded_execution(df, download_folder, metadata_file_path, primary_col, alternative_col, brnum_col):
-    results = []  # Collect results for each BRnum and status
-
-    with ThreadPoolExecutor() as executor:
-        # Map rows to threads for processing
-        future_to_row = {
-            executor.submit(process_row, row, download_folder, primary_col, alternative_col, brnum_col, metadata_file_path): row
-            for _, row in df.iterrows()
-        }
-
-        # Process threads and handle results
-        for future in as_completed(future_to_row):
-            row = future_to_row[future]
-            try:
-                # Get the result from the thread and collect it
-                result = future.result()
+# Rows are submitted lazily, at most `max_in_flight` at a time. Each (BRnum, status) result is passed to
+# `result_sink` when given (nothing is kept in memory), otherwise all results are returned sorted by BRnum.
+# With an AdaptiveConcurrency controller, the window follows its limit instead of `max_in_flight`.
+# With a RunMetrics object, each row is timed and counted in the run report.
+# With `verify_pdfs`, each downloaded file is checked in `verify_processes` worker processes (see pdf_verifier).
+# With UrlChecks from url_prevalidator, URLs known to fail for good are not requested again.
+def run_threaded_execution(df, download_folder, metadata_file_path, primary_col, alternative_col, brnum_col,
+                           metadata_flush_every=500, metadata_flush_interval=30.0, journal_file_path=None,
+                           download_options=None, scheduler=None, retry_policy=None, deduplicate=False,
+                           http_cache=None, max_workers=None, max_in_flight=None, result_sink=None,
+                           concurrency=None, metrics=None, verify_pdfs=False, verify_processes=None,
+                           url_checks=None):
+    results = []  # Collect results for each BRnum and status (when no sink is given)
+    if concurrency is not None:
+        max_workers = concurrency.max_workers
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)  # ThreadPoolExecutor's default
+    max_in_flight = max_in_flight or IN_FLIGHT_PER_WORKER * max_workers
+
+    # Conditional requests: URLs downloaded by an earlier run are revalidated (304 reuses the file)
+    if http_cache is not None:
+        download_options = dict(download_options or {}, http_cache=http_cache)
+
+    # Deduplication: each URL is fetched once per run and identical PDFs are stored once
+    content_store = ContentStore(download_folder) if deduplicate else None
+    url_cache = UrlCache() if deduplicate else None
+
+    # With a per-host scheduler, spread each host's rows over the run and honour Retry-After answers
+    session = get_session()
+    if scheduler is not None:
+        df = interleave_by_host(df, primary_col)
+        session.hooks["response"].append(scheduler.response_hook)
+
+    # A single background writer owns the metadata file; workers only enqueue their status
+    # (and append it to the journal, so an interrupted run can be recovered)
+    metadata_writer = MetadataWriter(metadata_file_path, metadata_flush_every, metadata_flush_interval,
+                                     journal_path=journal_file_path)
+    # Downloaded files are verified in worker processes, whose results go to the same writer
+    verifier = PdfVerifier(metadata_writer, verify_processes, http_cache=http_cache) if verify_pdfs else None
+
+    # Function to collect the result of a finished row
+    def collect(future, row):
+        try:
+            # Get the result from the thread and hand it to the sink (or collect it)
+            result = future.result()
+            if result_sink is not None:
+                result_sink(result)
+            else:
                 results.append(result)
-                print(f"Row {row.name} with BRnum {row[brnum_col]} processed with result: {result[1]}")
-            except Exception as e:
-                print(f"Error processing row {row.name} with BRnum {row[brnum_col]}: {e}")
+            logger.debug("Row %s with BRnum %s processed with result: %s", row.name, row[brnum_col], result[1])
+        except Exception as e:
+            logger.error("Error processing row %s with BRnum %s: %s", row.name, row[brnum_col], e)
+
+    task = metrics.track(process_row) if metrics is not None else process_row
+
+    # The HTTP cache is saved once the verifier is done, since failed checks drop their cache entries
+    try:
+        with metadata_writer, verifier or nullcontext(), ThreadPoolExecutor(max_workers) as executor:
+            future_to_row = {}  # Only the rows in flight
+            try:
+                # Map rows to threads as they are read, waiting for a slot when the window is full
+                for _, row in df.iterrows():
+                    while len(future_to_row) >= (concurrency.limit if concurrency is not None else max_in_flight):
+                        done, _ = wait(future_to_row, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future, future_to_row.pop(future))
+                    future = executor.submit(task, row, download_folder, primary_col, alternative_col,
+                                             brnum_col, metadata_file_path, metadata_writer, download_options,
+                                             scheduler, retry_policy, content_store, url_cache, concurrency,
+                                             verifier, url_checks)
+                    future_to_row[future] = row
+
+                # Process the last threads and handle results
+                while future_to_row:
+                    done, _ = wait(future_to_row, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, future_to_row.pop(future))
+            except (KeyboardInterrupt, SystemExit):
+                # Drop the rows that have not started; the writer still flushes what is done
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                if scheduler is not None:
+                    session.hooks["response"].remove(scheduler.response_hook)
+    finally:
+        if http_cache is not None:
+            http_cache.save()
 
     # Sort results by BRnum for consistency
     results.sort(key=lambda x: x[0])  # Sort by BRnum
@@ -46,30 +134,85 @@ def run_threaded_execution(df, download_folder, metadata_file_path, primary_col,
 
 
 # Function to process each row and update metadata
-def process_row(row, download_folder, primary_col, alternative_col, brnum_col, metadata_file_path):
+def process_row(row, download_folder, primary_col, alternative_col, brnum_col, metadata_file_path,
+                metadata_writer=None, download_options=None, scheduler=None, retry_policy=None,
+                content_store=None, url_cache=None, concurrency=None, verifier=None, url_checks=None):
+    retry_policy = retry_policy or RetryPolicy(max_attempts=1)
     try:
         brnum = row[brnum_col]
-        print(f"Processing row {row.name} with BRnum {brnum}...")
-
-        # Validate the URL and attempt download
-        url = get_valid_url(row, primary_col, alternative_col)
-        if url:
-            print(f"Valid URL found for BRnum {brnum}, initiating download...")
-            status = download_pdf(url, brnum, download_folder)
-        else:
+        logger.debug("Processing row %s with BRnum %s", row.name, brnum)
+
+        # One attempt at the URL, inside the per-host concurrency and rate limits if any
+        # (timed as "validate"; fetch_pdf books the body to "download" and "disk_write").
+        # Returns the result and the duration of the request alone, once the host's slot is held.
+        def attempt(url):
+            with scheduler.slot(url) if scheduler is not None else nullcontext(), run_metrics.stage("validate"):
+                started = time.monotonic()
+                result = fetch_pdf(url, brnum, download_folder, **(download_options or {}))
+                return result, time.monotonic() - started
+
+        # The same, reporting its duration, bytes and outcome to the run metrics and the
+        # adaptive concurrency controller. Both measure the remote host: the wait for a local slot
+        # is not part of its latency.
+        def fetch(url):
+            (status, reason, details), request_time = attempt(url)
+            run_metrics.request(url, request_time, reason)
+            if concurrency is not None:
+                received = 0 if details.get("not_modified") else details.get("bytes", 0)
+                concurrency.record(reason, request_time, received)
+            return status, reason, details
+
+        # All attempts at the URL: recoverable failures (timeouts, 5xx, ...) are retried with backoff,
+        # and a downloaded PDF is registered in the content store (a file reused after a 304 already is)
+        def fetch_with_retries(url):
+            status, reason, details, tries = retry_policy.call(lambda: fetch(url))
+            if status == "Downloaded" and content_store is not None and not details.get("not_modified"):
+                details["object_path"] = content_store.adopt(details["file_path"], details["sha256"])
+            return status, reason, details, tries
+
+        # Validate and download with one request per URL, falling back to the alternative column
+        status, reason, details, attempts = None, NO_URL, {}, 0
+        for url in candidate_urls(row, primary_col, alternative_col):
+            if url_checks is not None and url_checks.skip(url):
+                reason = url_checks.reason(url)  # Prevalidation found it dead or not a PDF: no request
+                continue
+            if url_cache is None:
+                status, reason, details, tries = fetch_with_retries(url)
+            else:
+                (status, reason, details, tries), owner = url_cache.run(url, lambda: fetch_with_retries(url))
+                if not owner:
+                    tries = 0  # Fetched for another BRnum in this run
+                    if status == "Downloaded":
+                        own_path = os.path.join(download_folder, pdf_file_name(url, brnum))
+                        details = content_store.share(details, own_path)
+            attempts += tries
+            if status is not None:
+                logger.debug("Valid URL found for BRnum %s: %s", brnum, url)
+                break
+        if status is None:
             status = "Not downloaded"
-            print(f"No valid URL found for BRnum {brnum}")
+            logger.info("No valid URL found for BRnum %s (%s)", brnum, reason,
+                        extra={"brnum": brnum, "reason": reason})
+        run_metrics.annotate(reason=reason, attempts=attempts)
 
-        # Safely update metadata with locking
-        update_metadata(brnum, status, metadata_file_path)
-        print(f"Metadata updated for BRnum {brnum} with status '{status}'")
+        # Queue the update for the batched writer (or fall back to the locked per-row update)
+        with run_metrics.stage("metadata"):
+            if metadata_writer is not None:
+                metadata_writer.submit(brnum, status, status_detail=reason, attempts=attempts,
+                                       sha256=details.get("sha256"))
+            else:
+                update_metadata(brnum, status, metadata_file_path)
+        # The check of the file runs in another process and updates the metadata when done
+        if status == "Downloaded" and verifier is not None:
+            verifier.submit(brnum, details["file_path"], url)
+        logger.debug("Metadata updated for BRnum %s with status '%s'", brnum, status)
 
     except KeyError as e:
-        print(f"Key error processing row {row.name}: {e}")
+        logger.error("Key error processing row %s: %s", row.name, e)
         status = "KeyError"
 
     except Exception as e:
-        print(f"Error processing BRnum {row.get(brnum_col, 'Unknown')}: {e}")
+        logger.error("Error processing BRnum %s: %s", row.get(brnum_col, 'Unknown'), e)
         status = "Processing Error"
 
     return brnum, status
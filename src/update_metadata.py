@@ -9,11 +9,13 @@
 # 1. Reads the existing metadata file or creates a new one if it doesn't exist.
 # 2. Updates or appends the status of each BRnum based on the results of the download process.
 # 3. Saves the updated metadata file back to disk.
+# Per-row details are logged at DEBUG level, so they cost nothing at the default level.
 # This ensures that the metadata file remains accurate and up-to-date throughout the process.
 
 # update_metadata.py
 
 import pandas as pd
+import logging
 import os
 import signal
 import sys
@@ -22,6 +24,8 @@ import threading
 # Lock to prevent race conditions (in writing metadata to Metadata2024.xlsx and avoiding file corruption)
 metadata_lock = threading.Lock()
 
+logger = logging.getLogger(__name__)
+
 # Global variable to track interruptions (with CTRL + C)
 interrupted = False
 
@@ -57,33 +61,33 @@ def update_metadata(brnum, status, metadata_file_path):
             # Step 2: Load or create the metadata DataFrame
             if os.path.exists(metadata_file_path):
                 metadata_df = pd.read_excel(metadata_file_path, engine="openpyxl")
-                print(f"Metadata file loaded. Existing entries: {len(metadata_df)}")
+                logger.debug("Metadata file loaded. Existing entries: %d", len(metadata_df))
             else:
                 metadata_df = pd.DataFrame(columns=["BRnum", "pdf_downloaded"])
-                print("Metadata file does not exist. Creating a new one.")
+                logger.debug("Metadata file does not exist. Creating a new one.")
 
             # Step 3: Update existing BRnum or append a new one
             if brnum in metadata_df["BRnum"].values:
                 metadata_df.loc[metadata_df["BRnum"] == brnum, "pdf_downloaded"] = status
-                print(f"Updated existing entry for BRnum {brnum}.")
+                logger.debug("Updated existing entry for BRnum %s.", brnum)
             else:
                 new_row = {"BRnum": brnum, "pdf_downloaded": status}
                 metadata_df = pd.concat([metadata_df, pd.DataFrame([new_row])], ignore_index=True)
-                print(f"Added new entry for BRnum {brnum}.")
+                logger.debug("Added new entry for BRnum %s.", brnum)
 
             # Step 4: Sort by BRnum in ascending order
             metadata_df = metadata_df.sort_values(by="BRnum").reset_index(drop=True)
-            print("Sorted metadata entries by BRnum.")
+            logger.debug("Sorted metadata entries by BRnum.")
 
             # Step 5: Save the metadata back to the file
             if not interrupted:  # Ensure no interruption before saving
                 with pd.ExcelWriter(metadata_file_path, engine="openpyxl", mode="w") as writer:
                     metadata_df.to_excel(writer, index=False)
-                print(f"Metadata successfully saved and updated for BRnum {brnum} with status: {status}")
-                print(f"Total entries now: {len(metadata_df)}")
+                logger.debug("Metadata saved for BRnum %s with status %s. Total entries now: %d",
+                             brnum, status, len(metadata_df))
 
     except Exception as e:
-        print(f"Error updating metadata for BRnum {brnum}: {e}")
+        logger.error("Error updating metadata for BRnum %s: %s", brnum, e)
 
     finally:
         # Step 6: Cleanup temporary files (if any)
@@ -92,5 +96,5 @@ def update_metadata(brnum, status, metadata_file_path):
         )
         if os.path.exists(temp_file_path):
             os.remove(temp_file_path)  # Remove temporary files if they exist
-            print(f"Temporary file {temp_file_path} removed.")
-        print("Process completed or safely terminated.")
+            logger.debug("Temporary file %s removed.", temp_file_path)
+        logger.debug("Metadata update completed or safely terminated.")
@@ -0,0 +1,135 @@
+# PDF DOWNLOADER & CHECKER & REGISTER FROM/TO URLs IN EXCEL FILES
+# Jean M. Babonneau | Nov. 2024 | MIT License
+
+# MODULAR PART 21: URL PREVALIDATION
+# This module adheres to the principle of "separation of concerns" by focusing solely on
+# its own task. It is designed for maintainability and reuse.
+# This module checks every distinct URL of the sheet once, before the downloads start.
+# It performs the following tasks:
+# 1. Collects the URLs of the primary and alternative columns, normalized and deduplicated.
+# 2. Probes each distinct URL once with a HEAD request, falling back to a Range GET of its first
+#    bytes when the server does not answer HEAD properly.
+# 3. Probes the URLs concurrently (primary and alternative columns alike), within the per-host limits.
+# 4. Keeps the outcome of each probe for the run, so the engines skip URLs known to be dead or
+#    not PDFs and go straight to the working candidate of each row.
+# This costs one round-trip per distinct URL instead of a request per row and column.
+
+# url_prevalidator.py
+
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import pandas as pd
+import requests
+
+from validate_urls import normalize_url, url_key
+from http_session import get_session
+from download_pdf import PDF_MAGIC, is_pdf_response
+from retry_policy import OK, NOT_PDF, RETRYABLE_REASONS, classify_exception, classify_status
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a probe answer
+PROBE_TIMEOUT = 5
+
+# Threads probing URLs at the same time
+PROBE_WORKERS = 32
+
+# HEAD answers meaning "ask again with GET" rather than "this URL is broken"
+HEAD_UNSUPPORTED = {403, 405, 501}
+
+
+# Function to collect the distinct URLs of the sheet (normalized, one per deduplication key)
+def collect_urls(df, primary_col, alternative_col):
+    urls = pd.concat([df[primary_col], df[alternative_col]], ignore_index=True).dropna()
+    urls = urls.map(normalize_url).dropna()
+    keys = urls.map(url_key)
+    return list(urls[~keys.duplicated()])
+
+
+# Function to probe one URL: HEAD first, then a Range GET of the first bytes if HEAD is refused
+# or does not tell whether the URL is a PDF. Returns the reason (OK when the URL serves a PDF).
+def probe_url(url, session=None, timeout=PROBE_TIMEOUT):
+    session = session or get_session()
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+        response.close()
+        if response.status_code == 200 and is_pdf_response(response, b""):
+            return OK
+        if response.status_code == 200 and response.headers.get('Content-Type', '').lower().startswith('text/html'):
+            return NOT_PDF  # Report page
+        if response.status_code != 200 and response.status_code not in HEAD_UNSUPPORTED:
+            return classify_status(response.status_code)
+
+        headers = {"Range": f"bytes=0-{len(PDF_MAGIC) - 1}"}
+        with session.get(url, headers=headers, allow_redirects=True, timeout=timeout, stream=True) as response:
+            if response.status_code not in (200, 206):
+                return classify_status(response.status_code)
+            # A server ignoring the Range sends the whole file: read the first bytes only
+            first_bytes = next(response.iter_content(len(PDF_MAGIC)), b"")
+            return OK if is_pdf_response(response, first_bytes) else NOT_PDF
+    except requests.RequestException as e:
+        return classify_exception(e)
+
+
+class UrlChecks:
+    """
+    Outcome of the prevalidation of each distinct URL, for the whole run.
+
+    Args:
+        reasons (dict): Deduplication key (see validate_urls.url_key) -> probe reason.
+    """
+
+    def __init__(self, reasons=None):
+        self.reasons = dict(reasons or {})
+
+    def reason(self, url):
+        # Probe reason of a URL, or None if it was not probed
+        return self.reasons.get(url_key(url))
+
+    def skip(self, url):
+        # True for URLs known to fail for good (4xx, not a PDF); temporary failures are tried again
+        reason = self.reason(url)
+        return reason is not None and reason != OK and reason not in RETRYABLE_REASONS
+
+    def counts(self):
+        return Counter(self.reasons.values())
+
+
+def prevalidate(df, primary_col, alternative_col, max_workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT,
+                scheduler=None):
+    """
+    Probes every distinct URL of the sheet once, concurrently.
+
+    Args:
+        df (pd.DataFrame): The rows to process.
+        primary_col (str): Column holding the primary URL.
+        alternative_col (str): Column holding the alternative URL.
+        max_workers (int): Threads probing at the same time.
+        timeout (float): Seconds to wait for each probe.
+        scheduler (HostScheduler): Optional per-host limits applied to the probes, whose Retry-After
+            answers also pause the host for the downloads that follow.
+
+    Returns:
+        UrlChecks: The probe reason of each URL, to pass to the execution engine.
+    """
+    urls = collect_urls(df, primary_col, alternative_col)
+    session = get_session()
+
+    def probe(url):
+        with scheduler.slot(url) if scheduler is not None else nullcontext():
+            return probe_url(url, session, timeout)
+
+    if scheduler is not None:
+        session.hooks["response"].append(scheduler.response_hook)
+    try:
+        with ThreadPoolExecutor(max_workers) as executor:
+            reasons = dict(zip(map(url_key, urls), executor.map(probe, urls)))
+    finally:
+        if scheduler is not None:
+            session.hooks["response"].remove(scheduler.response_hook)
+    checks = UrlChecks(reasons)
+    logger.info("Prevalidated %d distinct URLs: %s", len(urls), dict(checks.counts()))
+    return checks
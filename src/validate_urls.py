@@ -9,31 +9,79 @@
 # 1. Checks the accessibility and validity of URLs using HTTP requests.
 # 2. Ensures that the URL points to a PDF file (by checking the file extension).
 # 3. Provides functions to extract valid URLs from the primary or alternative columns.
+# 4. Normalizes URLs (spaces, case of scheme and host, default ports, fragments) so trivially
+#    different spellings of a URL are fetched once.
 # This ensures that only valid URLs are processed, reducing errors in the download step.
 
 # validate_urls.py
 
 import requests
 import pandas as pd  # Retained for main workflow consistency
+from urllib.parse import urlsplit, urlunsplit
+from http_session import get_session
+from retry_policy import OK
 
 # Function to validate a URL by checking its accessibility and content type
-def validate_url(url):
+def validate_url(url, session=None):
+    session = session or get_session()  # Pooled keep-alive connections
     try:
-        response = requests.get(url, allow_redirects=True, timeout=2)  # Changed to GET for more thorough validation
+        # GET for more thorough validation, streamed so only the headers are read, not the whole PDF
+        response = session.get(url, allow_redirects=True, timeout=2, stream=True)
+        response.close()
         # Check for a successful response and that the URL ends in '.pdf'
         return response.status_code == 200 and response.headers.get('Content-Type', '').lower().startswith('application/pdf')
     except requests.RequestException:
         return False
 
+# Ports implied by each scheme, dropped from normalized URLs
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Function to normalize a URL: trimmed, lower-case scheme and host, no default port and no fragment
+# (None for an empty cell)
+def normalize_url(url):
+    if not isinstance(url, str) or not url.strip():
+        return None
+    url = url.strip()
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url  # Not an absolute URL: left for the request to reject
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    try:
+        if parts.port is not None and parts.port == DEFAULT_PORTS.get(scheme):
+            netloc = netloc.rsplit(":", 1)[0]
+    except ValueError:  # Invalid port
+        pass
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+# Function to build the deduplication key of a URL: the normalized URL without its scheme,
+# so "http://" and "https://" spellings of the same address count once
+def url_key(url):
+    url = normalize_url(url)
+    if url is None:
+        return None
+    return url.split("://", 1)[-1]
+
+# Function to list the URLs of a row to try, primary column first (normalized, each address once)
+def candidate_urls(row, primary_col, alternative_col):
+    urls = {}
+    for url in (row.get(primary_col), row.get(alternative_col)):
+        if pd.notna(url):  # Use pd.notna to handle NaN values in DataFrame
+            url = normalize_url(url)
+            if url is not None:
+                urls.setdefault(url_key(url), url)
+    return list(urls.values())
+
 # Function to retrieve a valid URL from primary or alternative column
-def get_valid_url(row, primary_col, alternative_col):
-    primary_url = row.get(primary_col)
-    alternative_url = row.get(alternative_col)
-
-    if pd.notna(primary_url) and validate_url(primary_url):  # Use pd.notna to handle NaN values in DataFrame
-        return primary_url
-    if pd.notna(alternative_url) and validate_url(alternative_url):
-        return alternative_url
+# With the UrlChecks of a prevalidation (see url_prevalidator), probed URLs are not requested again
+def get_valid_url(row, primary_col, alternative_col, url_checks=None):
+    for url in candidate_urls(row, primary_col, alternative_col):
+        if url_checks is not None and url_checks.reason(url) == OK:
+            return url
+        if url_checks is not None and url_checks.skip(url):
+            continue
+        if validate_url(url):
+            return url
 
     return None
 
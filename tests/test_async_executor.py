@@ -0,0 +1,102 @@
+import pytest
+import asyncio
+import pandas as pd
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+pytest.importorskip("aiohttp")  # The async engine is optional
+
+import aiohttp
+from async_executor import run_async_execution, fetch_pdf_async
+
+PDF_BODY = b"%PDF-1.7 " + b"x" * 200_000
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """
+    Serve a PDF under /*.pdf, an HTML page under /*.html, 416 under /*.gone and 404 otherwise.
+    """
+    range_headers = []  # Range header of each request for a /*.gone path
+
+    def do_GET(self):
+        if self.path.endswith(".gone"):
+            ReportHandler.range_headers.append(self.headers.get("Range"))
+            self.send_response(416)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path.endswith(".pdf"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(PDF_BODY)))
+            self.end_headers()
+            self.wfile.write(PDF_BODY)
+        elif self.path.endswith(".html"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", "6")
+            self.end_headers()
+            self.wfile.write(b"<html>")
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    """
+    Start a local HTTP server for the duration of a test.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ReportHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_engine(server_url, tmp_path):
+    """
+    Test that the async engine downloads PDFs, falls back to the alternative URL and records every status.
+    """
+    df = pd.DataFrame({
+        "BRnum": ["BR0001", "BR0002", "BR0003"],
+        "Pdf_URL": [f"{server_url}/a.pdf", f"{server_url}/missing", f"{server_url}/page.html"],
+        "Report Html Address": [None, f"{server_url}/b.pdf", None],
+    })
+    metadata_path = str(tmp_path / "Metadata2024.xlsx")
+
+    results = run_async_execution(df, str(tmp_path), metadata_path, "Pdf_URL", "Report Html Address", "BRnum",
+                                  max_concurrency=2)
+
+    assert results == [("BR0001", "Downloaded"), ("BR0002", "Downloaded"), ("BR0003", "Not downloaded")]
+    assert (tmp_path / "BR0001_a.pdf").read_bytes() == PDF_BODY
+    assert (tmp_path / "BR0002_b.pdf").read_bytes() == PDF_BODY
+    metadata_df = pd.read_excel(metadata_path)
+    assert metadata_df["pdf_downloaded"].tolist() == ["Downloaded", "Downloaded", "Not downloaded"]
+
+
+def test_async_fetch_gives_up_after_second_416(server_url, tmp_path):
+    """
+    Test that a 416 answer drops the partial file and retries once without a Range header, then gives up.
+    """
+    url = f"{server_url}/report.gone"
+    (tmp_path / "BR0001_report.gone.part").write_bytes(b"%PDF-old")
+    (tmp_path / "BR0001_report.gone.part.json").write_text(f'{{"url": "{url}", "etag": "v1", "last_modified": null}}')
+    ReportHandler.range_headers.clear()
+
+    async def fetch():
+        async with aiohttp.ClientSession() as session:
+            return await fetch_pdf_async(session, url, "BR0001", str(tmp_path))
+
+    assert asyncio.run(fetch()) == (None, "http_4xx", {})
+    assert ReportHandler.range_headers == ["bytes=8-", None]
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,46 @@
+import sys
+import os
+import requests
+
+# Add the src and benchmarks directories to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from mock_server import MockPdfServer, make_source_frame
+from run_benchmarks import run_benchmarks
+
+
+def test_mock_server_serves_pdfs_and_errors():
+    """
+    Test that the mock server serves PDFs of the requested size, HTML pages and 503 errors.
+    """
+    with MockPdfServer(hosts=2) as server:
+        response = requests.get(f"{server.base_urls[1]}/r.pdf?size=5000", timeout=5)
+        assert response.status_code == 200
+        assert len(response.content) == 5000 and response.content.startswith(b"%PDF")
+        assert requests.get(f"{server.base_urls[0]}/r.html", timeout=5).headers["Content-Type"] == "text/html"
+
+    with MockPdfServer(error_rate=1.0) as server:
+        assert requests.get(f"{server.base_urls[0]}/r.pdf", timeout=5).status_code == 503
+
+
+def test_source_frame_spreads_hosts():
+    """
+    Test that the synthetic sheet spreads rows over the hosts and uses the alternative column for HTML rows.
+    """
+    df = make_source_frame(10, ["http://h1", "http://h2"], size=10, html_rate=0.5)
+    assert list(df["BRnum"][:2]) == ["BR000000", "BR000001"]
+    assert df["Pdf_URL"].str.startswith("http://h1").sum() == 5
+    html_rows = df["Pdf_URL"].str.endswith(".html")
+    assert df.loc[html_rows, "Report Html Address"].str.endswith(".pdf?size=10").all()
+
+
+def test_benchmark_run():
+    """
+    Test a small in-process benchmark of the threaded engine.
+    """
+    results = run_benchmarks([20], engines=["threaded"], hosts=2, size=2000, latency=0.0, isolated=False)
+    assert len(results) == 1
+    assert results[0]["status_counts"] == {"Downloaded": 20}
+    assert results[0]["rows_per_second"] > 0
+    assert results[0]["batched_write_seconds"] >= 0
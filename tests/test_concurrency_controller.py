@@ -0,0 +1,72 @@
+import sys
+import os
+from unittest.mock import patch
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from concurrency_controller import AdaptiveConcurrency, percentile
+
+
+def feed(controller, count, reason="ok", elapsed=0.1, nbytes=1000):
+    for _ in range(count):
+        controller.record(reason, elapsed, nbytes)
+
+
+def test_percentile():
+    """
+    Test the percentile helper on a small list.
+    """
+    assert percentile([], 90) == 0.0
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile(list(range(1, 11)), 90) == 10
+
+
+def test_additive_increase_up_to_max():
+    """
+    Test that healthy samples add one worker each, without going above max_workers.
+    """
+    controller = AdaptiveConcurrency(min_workers=2, max_workers=4, sample_size=5)
+    feed(controller, 5)
+    assert controller.limit == 3
+    feed(controller, 20)
+    assert controller.limit == 4
+
+
+def test_multiplicative_decrease_on_errors():
+    """
+    Test that a sample with many timeouts halves the concurrency, not below min_workers.
+    """
+    controller = AdaptiveConcurrency(min_workers=2, max_workers=64, initial=16, sample_size=10)
+    feed(controller, 5)
+    feed(controller, 5, reason="timeout")
+    assert controller.limit == 8
+    assert controller.last_sample["error_rate"] == 0.5
+    feed(controller, 30, reason="http_5xx")
+    assert controller.limit == 2
+
+
+def test_latency_jump_and_permanent_failures():
+    """
+    Test that a latency jump reduces the concurrency and that 404s are not counted as overload.
+    """
+    controller = AdaptiveConcurrency(min_workers=1, max_workers=64, initial=10, sample_size=10)
+    feed(controller, 10, reason="http_4xx", elapsed=0.1)
+    assert controller.limit == 11
+    feed(controller, 10, elapsed=1.0)
+    assert controller.limit == 5
+
+
+@patch("concurrency_controller.time.monotonic")
+def test_increase_taken_back_when_throughput_drops(mock_monotonic):
+    """
+    Test that an added worker is removed when throughput fell after the increase.
+    """
+    mock_monotonic.return_value = 0.0
+    controller = AdaptiveConcurrency(min_workers=1, max_workers=64, initial=10, sample_size=10)
+    mock_monotonic.return_value = 1.0
+    feed(controller, 10, nbytes=1000)  # 10 kB/s
+    assert controller.limit == 11
+    mock_monotonic.return_value = 3.0
+    feed(controller, 10, nbytes=1000)  # 5 kB/s
+    assert controller.limit == 10
@@ -0,0 +1,96 @@
+import pandas as pd
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from content_store import ContentStore, UrlCache
+from threaded_executor import run_threaded_execution
+
+
+def test_identical_bytes_stored_once(tmp_path):
+    """
+    Test that two files with the same content end up sharing one stored object.
+    """
+    store = ContentStore(str(tmp_path))
+    first, second = tmp_path / "BR0001_a.pdf", tmp_path / "BR0002_b.pdf"
+    first.write_bytes(b"%PDF same")
+    second.write_bytes(b"%PDF same")
+
+    object_path = store.adopt(str(first), "ab" * 32)
+    assert store.adopt(str(second), "ab" * 32) == object_path
+    assert os.path.samefile(first, object_path)
+    assert os.path.samefile(second, object_path)
+    assert second.read_bytes() == b"%PDF same"
+
+
+def test_adopt_twice_leaves_no_temporary_link(tmp_path):
+    """
+    Test that adopting a file that is already a link to its stored object leaves no "*.link" file behind.
+    """
+    store = ContentStore(str(tmp_path))
+    first, second = tmp_path / "BR0001_a.pdf", tmp_path / "BR0002_a.pdf"
+    first.write_bytes(b"%PDF same")
+    second.write_bytes(b"%PDF same")
+
+    object_path = store.adopt(str(first), "ab" * 32)
+    store.adopt(str(second), "ab" * 32)
+    assert store.adopt(str(first), "ab" * 32) == object_path
+    assert store.adopt(str(second), "ab" * 32) == object_path
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".store", "BR0001_a.pdf", "BR0002_a.pdf"]
+
+
+def test_url_cache_runs_fetch_once():
+    """
+    Test that concurrent callers for the same URL share a single fetch.
+    """
+    cache = UrlCache()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return "result"
+
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(cache.run("https://a.com/r.pdf", fetch)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(owner for _, owner in outcomes) == [False] * 4 + [True]
+    assert {result for result, _ in outcomes} == {"result"}
+
+
+@patch("threaded_executor.fetch_pdf")
+def test_shared_url_downloaded_once(mock_fetch, tmp_path):
+    """
+    Test that rows sharing a URL trigger one download and each get their BRnum-prefixed file.
+    """
+    def fake_fetch(url, brnum, download_folder, **kwargs):
+        file_path = os.path.join(download_folder, f"{brnum}_group.pdf")
+        with open(file_path, "wb") as f:
+            f.write(b"%PDF group report")
+        return "Downloaded", "ok", {"file_path": file_path, "bytes": 17, "sha256": "cd" * 32}
+
+    mock_fetch.side_effect = fake_fetch
+    df = pd.DataFrame({"BRnum": ["BR0001", "BR0002", "BR0003"],
+                       "Pdf_URL": ["https://a.com/group.pdf"] * 3,
+                       "Report Html Address": [None] * 3})
+
+    results = run_threaded_execution(df, str(tmp_path), str(tmp_path / "Metadata2024.xlsx"), "Pdf_URL",
+                                     "Report Html Address", "BRnum", deduplicate=True)
+
+    assert results == [("BR0001", "Downloaded"), ("BR0002", "Downloaded"), ("BR0003", "Downloaded")]
+    assert mock_fetch.call_count == 1
+    for brnum in ("BR0001", "BR0002", "BR0003"):
+        assert (tmp_path / f"{brnum}_group.pdf").read_bytes() == b"%PDF group report"
+    metadata_df = pd.read_excel(tmp_path / "Metadata2024.xlsx")
+    assert set(metadata_df["sha256"]) == {"cd" * 32}
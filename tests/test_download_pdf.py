@@ -1,15 +1,22 @@
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 import sys
 import os
 
 # Add the src directory to sys.path before importing project modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
-from download_pdf import download_pdf  # Import after modifying sys.path
+from download_pdf import download_pdf, fetch_valid_pdf, fetch_pdf  # Import after modifying sys.path
 import requests  # Import requests for the HTTPError exception
 
-@patch("download_pdf.requests.get")
+@pytest.fixture
+def mock_get():
+    """
+    Replace the shared HTTP session with a mock and return its get method.
+    """
+    with patch("download_pdf.get_session") as mock_get_session:
+        yield mock_get_session.return_value.get
+
 def test_download_pdf_success(mock_get):
     """
     Test download_pdf with a mocked valid URL and BRnum.
@@ -17,7 +24,8 @@ def test_download_pdf_success(mock_get):
     # Mock the response for a successful download
     mock_response = Mock()
     mock_response.status_code = 200
-    mock_response.content = b"PDF content"
+    mock_response.headers = {}
+    mock_response.iter_content.return_value = iter([b"PDF ", b"content"])
     mock_get.return_value = mock_response
 
     url = "https://example.com/sample.pdf"  # Placeholder URL
@@ -27,7 +35,6 @@ def test_download_pdf_success(mock_get):
     result = download_pdf(url, brnum, download_folder)
     assert result == "Downloaded"
 
-@patch("download_pdf.requests.get")
 def test_download_pdf_failure(mock_get):
     """
     Test download_pdf with a mocked invalid URL.
@@ -35,7 +42,8 @@ def test_download_pdf_failure(mock_get):
     # Mock the response for a failed download
     mock_response = Mock()
     mock_response.status_code = 404
-    mock_response.content = b""  # Empty byte string to simulate no content
+    mock_response.headers = {}
+    mock_response.iter_content.return_value = iter([])  # No content
     mock_response.raise_for_status.side_effect = requests.HTTPError("404 Client Error: Not Found for url")
     mock_get.return_value = mock_response
 
@@ -48,6 +56,128 @@ def test_download_pdf_failure(mock_get):
 
  
     
+def make_stream_response(status_code=200, content_type="application/pdf", chunks=(b"%PDF-1.7 ", b"rest")):
+    """
+    Build a mocked streaming response usable as a context manager.
+    """
+    mock_response = MagicMock()
+    mock_response.__enter__.return_value = mock_response
+    mock_response.status_code = status_code
+    mock_response.headers = {"Content-Type": content_type}
+    mock_response.iter_content.return_value = iter(chunks)
+    return mock_response
+
+def test_fetch_valid_pdf_single_request(mock_get, tmp_path):
+    """
+    Test that fetch_valid_pdf validates and saves the PDF from one streaming GET.
+    """
+    mock_get.return_value = make_stream_response()
+
+    result = fetch_valid_pdf("https://example.com/report.pdf", "BR0001", str(tmp_path))
+    assert result == "Downloaded"
+    assert mock_get.call_count == 1
+    assert (tmp_path / "BR0001_report.pdf").read_bytes() == b"%PDF-1.7 rest"
+
+def test_fetch_valid_pdf_magic_bytes(mock_get, tmp_path):
+    """
+    Test that a generic Content-Type is accepted when the body starts with the PDF header.
+    """
+    mock_get.return_value = make_stream_response(content_type="application/octet-stream")
+    assert fetch_valid_pdf("https://example.com/report", "BR0001", str(tmp_path)) == "Downloaded"
+
+def test_fetch_valid_pdf_html_aborts(mock_get, tmp_path):
+    """
+    Test that an HTML page is rejected without reading its body.
+    """
+    mock_response = make_stream_response(content_type="text/html; charset=utf-8", chunks=(b"<html>",))
+    mock_get.return_value = mock_response
+
+    assert fetch_valid_pdf("https://example.com/report.html", "BR0001", str(tmp_path)) is None
+    mock_response.iter_content.assert_not_called()
+    assert list(tmp_path.iterdir()) == []
+
+def test_download_streams_to_part_file(mock_get, tmp_path):
+    """
+    Test that nothing is saved under the final name when the stream breaks half-way.
+    """
+    def broken_stream():
+        yield b"%PDF-1.7 "
+        raise requests.ConnectionError("Connection reset")
+
+    mock_response = make_stream_response(chunks=broken_stream())
+    mock_get.return_value = mock_response
+
+    assert fetch_valid_pdf("https://example.com/report.pdf", "BR0001", str(tmp_path)) == "Not downloaded"
+    assert list(tmp_path.iterdir()) == []
+
+def test_download_max_file_size(mock_get, tmp_path):
+    """
+    Test that downloads over the size limit are abandoned, announced or not.
+    """
+    mock_response = make_stream_response(chunks=(b"%PDF-1.7 ", b"x" * 100))
+    mock_get.return_value = mock_response
+    assert fetch_valid_pdf("https://example.com/a.pdf", "BR0001", str(tmp_path), max_file_size=50) == "Not downloaded"
+
+    mock_response = make_stream_response()
+    mock_response.headers["Content-Length"] = "1000"
+    mock_get.return_value = mock_response
+    assert fetch_valid_pdf("https://example.com/b.pdf", "BR0002", str(tmp_path), max_file_size=50) == "Not downloaded"
+    mock_response.iter_content.assert_not_called()
+    assert list(tmp_path.iterdir()) == []
+
+def test_download_keeps_part_for_resume(mock_get, tmp_path):
+    """
+    Test that an interrupted download with an ETag keeps its ".part" file and is resumed with a Range request.
+    """
+    def broken_stream():
+        yield b"%PDF-1.7 "
+        raise requests.ConnectionError("Read timed out")
+
+    url = "https://example.com/report.pdf"
+    mock_response = make_stream_response(chunks=broken_stream())
+    mock_response.headers["ETag"] = '"v1"'
+    mock_get.return_value = mock_response
+    assert fetch_valid_pdf(url, "BR0001", str(tmp_path)) == "Not downloaded"
+    assert (tmp_path / "BR0001_report.pdf.part").read_bytes() == b"%PDF-1.7 "
+
+    mock_response = make_stream_response(status_code=206, chunks=(b"rest",))
+    mock_response.headers.update({"ETag": '"v1"', "Content-Range": "bytes 9-12/13"})
+    mock_get.return_value = mock_response
+    assert fetch_valid_pdf(url, "BR0001", str(tmp_path)) == "Downloaded"
+
+    sent_headers = mock_get.call_args.kwargs["headers"]
+    assert sent_headers == {"Range": "bytes=9-", "If-Range": '"v1"'}
+    assert (tmp_path / "BR0001_report.pdf").read_bytes() == b"%PDF-1.7 rest"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["BR0001_report.pdf"]
+
+def test_download_restarts_when_range_ignored(mock_get, tmp_path):
+    """
+    Test that a 200 answer to a Range request replaces the partial file with the full body.
+    """
+    (tmp_path / "BR0001_report.pdf.part").write_bytes(b"%PDF-old")
+    (tmp_path / "BR0001_report.pdf.part.json").write_text(
+        '{"url": "https://example.com/report.pdf", "etag": "\\"v1\\"", "last_modified": null}')
+    mock_get.return_value = make_stream_response(chunks=(b"%PDF-1.7 ", b"new"))
+
+    assert fetch_valid_pdf("https://example.com/report.pdf", "BR0001", str(tmp_path)) == "Downloaded"
+    assert (tmp_path / "BR0001_report.pdf").read_bytes() == b"%PDF-1.7 new"
+
+def test_download_gives_up_after_second_416(mock_get, tmp_path):
+    """
+    Test that a 416 answer drops the partial file and retries once without a Range header, then gives up.
+    """
+    (tmp_path / "BR0001_report.pdf.part").write_bytes(b"%PDF-old")
+    (tmp_path / "BR0001_report.pdf.part.json").write_text(
+        '{"url": "https://example.com/report.pdf", "etag": "\\"v1\\"", "last_modified": null}')
+    mock_get.return_value = make_stream_response(status_code=416)
+
+    status, reason, details = fetch_pdf("https://example.com/report.pdf", "BR0001", str(tmp_path))
+    assert (status, reason, details) == (None, "http_4xx", {})
+    assert mock_get.call_count == 2
+    assert "Range" in mock_get.call_args_list[0].kwargs["headers"]
+    assert mock_get.call_args_list[1].kwargs["headers"] == {}
+    assert list(tmp_path.iterdir()) == []
+
 '''
 DIDACTIC COMMENT:
 Expanded Explanation of @patch
@@ -70,6 +200,6 @@ Speeds up tests by avoiding delays like network latency.
 
 4) In This Code:
 
-@patch("download_pdf.requests.get") replaces requests.get with a mock in the download_pdf module.
-The mock_get argument in the test function is the mock object for requests.get, which you can control to simulate different behaviors.
+The mock_get fixture uses patch("download_pdf.get_session") to replace the shared HTTP session with a mock in the download_pdf module.
+The mock_get argument in the test function is the mock object for session.get, which you can control to simulate different behaviors.
 '''
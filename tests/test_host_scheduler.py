@@ -0,0 +1,102 @@
+import pandas as pd
+import sys
+import os
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+import requests
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from host_scheduler import HostScheduler, host_of, interleave_by_host, parse_retry_after
+
+
+def test_interleave_by_host():
+    """
+    Test that rows are reordered round-robin across hosts, keeping each host's order.
+    """
+    df = pd.DataFrame({"Pdf_URL": [
+        "https://a.com/1.pdf", "https://a.com/2.pdf", "https://a.com/3.pdf",
+        "https://b.com/1.pdf", "https://B.com/2.pdf", None,
+    ]})
+    interleaved = interleave_by_host(df, "Pdf_URL")
+    assert interleaved.index.tolist() == [0, 3, 5, 1, 4, 2]
+
+
+def test_host_of_and_retry_after():
+    """
+    Test host extraction and both Retry-After formats.
+    """
+    assert host_of(" https://IR.Example.com:443/report.pdf") == "ir.example.com"
+    assert host_of(float("nan")) == ""
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+
+
+def test_rate_limit_per_host():
+    """
+    Test that the token bucket spaces requests to one host but not to another.
+    """
+    scheduler = HostScheduler(max_per_host=2, rate_per_host=20, burst=1)
+    start = time.monotonic()
+    for _ in range(3):
+        with scheduler.slot("https://a.com/report.pdf"):
+            pass
+    with scheduler.slot("https://b.com/report.pdf"):
+        pass
+    # 2 waits of 1/20s for a.com, none for b.com
+    assert 0.09 <= time.monotonic() - start < 0.5
+
+
+def test_response_hook_pauses_host():
+    """
+    Test that a 429 with Retry-After holds back the next request to that host.
+    """
+    scheduler = HostScheduler()
+    response = Mock(status_code=429, headers={"Retry-After": "1"}, url="https://a.com/report.pdf", history=[])
+    scheduler.response_hook(response)
+
+    assert scheduler._state("a.com").reserve() > 0.5
+    assert scheduler._state("b.com").reserve() == 0
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    """
+    Redirect /report.pdf to the same server under the "localhost" name, which answers 429.
+    """
+    def do_GET(self):
+        if self.path == "/report.pdf":
+            self.send_response(302)
+            self.send_header("Location", f"http://localhost:{self.server.server_address[1]}/throttled.pdf")
+        else:
+            self.send_response(429)
+            self.send_header("Retry-After", "30")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_response_hook_pauses_requested_host_after_redirect():
+    """
+    Test that a 429 received after a redirect pauses the host the request was scheduled for.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RedirectHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scheduler = HostScheduler()
+    url = f"http://127.0.0.1:{server.server_address[1]}/report.pdf"
+    try:
+        with requests.Session() as session:
+            session.hooks["response"].append(scheduler.response_hook)
+            with scheduler.slot(url):
+                assert session.get(url, timeout=5).status_code == 429
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert scheduler._state("127.0.0.1").reserve() > 20
+    assert scheduler._state("localhost").reserve() == 0
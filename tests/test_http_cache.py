@@ -0,0 +1,113 @@
+import pytest
+import pandas as pd
+import sys
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+# Add the src and benchmarks directories to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from http_cache import HttpCache
+from download_pdf import fetch_pdf
+from threaded_executor import run_threaded_execution
+from content_store import ContentStore
+from mock_server import MockPdfServer
+
+
+@pytest.fixture
+def mock_get():
+    """
+    Replace the shared HTTP session with a mock and return its get method.
+    """
+    with patch("download_pdf.get_session") as mock_get_session:
+        yield mock_get_session.return_value.get
+
+
+def make_response(status_code, headers, chunks=()):
+    """
+    Build a mocked streaming response usable as a context manager.
+    """
+    mock_response = MagicMock()
+    mock_response.__enter__.return_value = mock_response
+    mock_response.status_code = status_code
+    mock_response.headers = headers
+    mock_response.iter_content.return_value = iter(chunks)
+    return mock_response
+
+
+def test_not_modified_reuses_file(mock_get, tmp_path):
+    """
+    Test that a second run sends If-None-Match and reuses the file on a 304.
+    """
+    cache = HttpCache(str(tmp_path / "http_cache.json"))
+    mock_get.return_value = make_response(200, {"Content-Type": "application/pdf", "ETag": '"v1"'},
+                                          (b"%PDF-1.7 ", b"rest"))
+    status, _, details = fetch_pdf("https://example.com/report.pdf", "BR0001", str(tmp_path), http_cache=cache)
+    assert status == "Downloaded"
+    cache.save()
+
+    cache = HttpCache(str(tmp_path / "http_cache.json"))
+    mock_get.return_value = make_response(304, {})
+    status, reason, reused = fetch_pdf("https://example.com/report.pdf", "BR0002", str(tmp_path), http_cache=cache)
+
+    assert mock_get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+    assert (status, reason) == ("Downloaded", "ok")
+    assert reused["not_modified"] and reused["sha256"] == details["sha256"]
+    assert (tmp_path / "BR0002_report.pdf").read_bytes() == b"%PDF-1.7 rest"
+
+
+def test_eviction(tmp_path):
+    """
+    Test that expired entries and entries above the maximum count are dropped.
+    """
+    report = tmp_path / "report.pdf"
+    report.write_bytes(b"%PDF")
+    cache = HttpCache(str(tmp_path / "http_cache.json"), ttl=60, max_entries=1)
+    for name in ("a", "b", "c"):
+        cache.record(f"https://example.com/{name}.pdf", {"ETag": name}, str(report), 4)
+    cache._entries["https://example.com/c.pdf"]["fetched_at"] = time.time() - 120
+    assert cache.lookup("https://example.com/c.pdf") is None
+
+    cache.save()
+    assert list(HttpCache(str(tmp_path / "http_cache.json"))._entries) == ["https://example.com/b.pdf"]
+
+
+def test_no_validators_not_recorded(tmp_path):
+    """
+    Test that a response without ETag or Last-Modified is not cached.
+    """
+    cache = HttpCache(str(tmp_path / "http_cache.json"))
+    cache.record("https://example.com/a.pdf", {"Content-Type": "application/pdf"}, str(tmp_path / "a.pdf"), 4)
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize("engine", ["threaded", "async"])
+def test_rerun_with_store_leaves_only_pdfs(engine, tmp_path):
+    """
+    Test that a rerun with deduplication and the HTTP cache reuses the stored files (after 304 answers)
+    without leaving temporary links in the download folder.
+    """
+    if engine == "async":
+        pytest.importorskip("aiohttp")  # The async engine is optional
+        from async_executor import run_async_execution as run_execution
+    else:
+        run_execution = run_threaded_execution
+    download_folder = tmp_path / "downloads"
+    download_folder.mkdir()
+    http_cache = HttpCache(str(tmp_path / "http_cache.json"))
+
+    with MockPdfServer() as server:
+        shared_url, own_url = f"{server.base_urls[0]}/shared.pdf", f"{server.base_urls[0]}/own.pdf"
+        df = pd.DataFrame({"BRnum": ["BR1", "BR2", "BR3"], "Pdf_URL": [shared_url, shared_url, own_url],
+                           "Report Html Address": [None, None, None]})
+        for rerun in (False, True):
+            with patch.object(ContentStore, "adopt", autospec=True, side_effect=ContentStore.adopt) as adopt:
+                results = run_execution(df, str(download_folder), str(tmp_path / "Metadata2024.xlsx"), "Pdf_URL",
+                                        "Report Html Address", "BRnum", deduplicate=True, http_cache=http_cache)
+            assert [status for _, status in results] == ["Downloaded"] * 3
+            assert adopt.call_count == (0 if rerun else 2)  # Files reused after a 304 are already stored
+
+    assert sorted(p.name for p in download_folder.iterdir()) == [".store", "BR1_shared.pdf", "BR2_shared.pdf",
+                                                                 "BR3_own.pdf"]
@@ -0,0 +1,39 @@
+import pytest
+import sys
+import os
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from http_session import configure_sessions, get_session, close_session
+
+
+@pytest.fixture(autouse=True)
+def reset_session():
+    """
+    Restore the default pool settings after each test.
+    """
+    yield
+    configure_sessions()
+    close_session()
+
+
+def test_session_is_shared():
+    """
+    Test that every caller gets the same pooled session until it is closed.
+    """
+    session = get_session()
+    assert get_session() is session
+    close_session()
+    assert get_session() is not session
+
+
+def test_configure_pool_sizes():
+    """
+    Test that the adapter of the session uses the configured pool sizes.
+    """
+    configure_sessions(pool_connections=5, pool_maxsize=3)
+    adapter = get_session().get_adapter("https://example.com/report.pdf")
+    assert adapter._pool_connections == 5
+    assert adapter._pool_maxsize == 3
+    assert adapter._pool_block is True
@@ -0,0 +1,45 @@
+import pytest
+import pandas as pd
+import sys
+import os
+from unittest.mock import patch
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from load_excel import load_excel
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "source.xlsx"
+    pd.DataFrame({"BRnum": ["BR0001", "BR0002"], "Pdf_URL": ["https://a.com/1.pdf", None],
+                  "Report Html Address": [None, "https://b.com/2.html"], "Notes": ["x", "y"]}).to_excel(path, index=False)
+    return str(path)
+
+
+def test_reads_only_requested_columns(workbook):
+    """
+    Test that only the requested columns are loaded and missing ones are ignored.
+    """
+    df = load_excel(workbook, ["BRnum", "Pdf_URL", "Missing"])
+    assert list(df.columns) == ["BRnum", "Pdf_URL"]
+    assert list(df["BRnum"]) == ["BR0001", "BR0002"]
+
+
+def test_cache_skips_parsing(workbook, tmp_path):
+    """
+    Test that a second load of an unchanged workbook comes from the cache, and a changed one is parsed again.
+    """
+    cache_dir = str(tmp_path / ".cache")
+    first = load_excel(workbook, ["BRnum", "Pdf_URL"], cache_dir)
+
+    with patch("load_excel.pd.read_excel") as mock_read_excel:
+        cached = load_excel(workbook, ["BRnum", "Pdf_URL"], cache_dir)
+        mock_read_excel.assert_not_called()
+    pd.testing.assert_frame_equal(cached, first)
+
+    pd.DataFrame({"BRnum": ["BR0003"], "Pdf_URL": ["https://c.com/3.pdf"]}).to_excel(workbook, index=False)
+    os.utime(workbook, ns=(0, 10**18))
+    assert list(load_excel(workbook, ["BRnum", "Pdf_URL"], cache_dir)["BRnum"]) == ["BR0003"]
+    assert len(os.listdir(cache_dir)) == 1
@@ -0,0 +1,59 @@
+import pytest
+import pandas as pd
+import sys
+import os
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from metadata_writer import MetadataWriter
+
+
+@pytest.fixture
+def metadata_file(tmp_path):
+    """
+    Create a small metadata file with one existing entry.
+    """
+    path = tmp_path / "Metadata2024.xlsx"
+    pd.DataFrame([{"BRnum": "BR0002", "pdf_downloaded": "Not downloaded"}]).to_excel(path, index=False)
+    return str(path)
+
+
+def test_writer_updates_and_appends(metadata_file):
+    """
+    Test that queued updates are applied to existing and new BRnum entries and sorted on write.
+    """
+    with MetadataWriter(metadata_file) as writer:
+        writer.submit("BR0003", "Downloaded")
+        writer.submit("BR0002", "Downloaded")
+        writer.submit("BR0001", "Not downloaded")
+
+    updated_df = pd.read_excel(metadata_file)
+    assert updated_df["BRnum"].tolist() == ["BR0001", "BR0002", "BR0003"]
+    assert updated_df.loc[updated_df["BRnum"] == "BR0002", "pdf_downloaded"].values[0] == "Downloaded"
+
+
+def test_writer_flushes_in_batches(metadata_file):
+    """
+    Test that the workbook is written once per batch instead of once per row.
+    """
+    writer = MetadataWriter(metadata_file, flush_every=10, flush_interval=60)
+    with writer:
+        for i in range(25):
+            writer.submit(f"BR{i:04d}", "Downloaded")
+
+    # 2 full batches of 10, plus the final flush on shutdown
+    assert writer.flush_count == 3
+    assert len(pd.read_excel(metadata_file)) == 25
+
+
+def test_writer_extra_columns(metadata_file):
+    """
+    Test that extra fields become new metadata columns.
+    """
+    with MetadataWriter(metadata_file) as writer:
+        writer.submit("BR0002", "Downloaded", pages=12)
+
+    updated_df = pd.read_excel(metadata_file)
+    assert list(updated_df.columns) == ["BRnum", "pdf_downloaded", "pages"]
+    assert updated_df.loc[0, "pages"] == 12
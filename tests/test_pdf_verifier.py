@@ -0,0 +1,102 @@
+import hashlib
+import pandas as pd
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add the src and benchmarks directories to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from pdf_verifier import verify_pdf, PdfVerifier
+from metadata_writer import MetadataWriter
+from http_cache import HttpCache
+from threaded_executor import run_threaded_execution
+from mock_server import MockPdfServer
+
+PDF_BYTES = b"%PDF-1.4\n" + b"0" * 5000 + b"\n%%EOF\n"
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_verify_pdf_checks_header_and_trailer(tmp_path):
+    """
+    Test the size, hash and reason reported for a complete, a truncated and a disguised file.
+    """
+    result = verify_pdf(write(tmp_path / "ok.pdf", PDF_BYTES), count_pages=False)
+    assert result == {"reason": "ok", "bytes": len(PDF_BYTES), "sha256": hashlib.sha256(PDF_BYTES).hexdigest(),
+                      "pages": None}
+    assert verify_pdf(write(tmp_path / "cut.pdf", PDF_BYTES[:3000]), False)["reason"] == "truncated_pdf"
+    assert verify_pdf(write(tmp_path / "page.pdf", b"<html></html>"), False)["reason"] == "not_pdf"
+    assert verify_pdf(str(tmp_path / "missing.pdf"), False)["reason"] == "disk_error"
+
+
+@patch("pdf_verifier.PdfReader")
+def test_verify_pdf_counts_pages(mock_reader, tmp_path):
+    """
+    Test that the pages are counted with PyPDF2, and that an unreadable structure is reported as corrupt.
+    """
+    mock_reader.return_value = MagicMock(is_encrypted=False, pages=[1, 2, 3])
+    assert verify_pdf(write(tmp_path / "ok.pdf", PDF_BYTES))["pages"] == 3
+
+    mock_reader.side_effect = ValueError("broken xref")
+    assert verify_pdf(write(tmp_path / "bad.pdf", PDF_BYTES))["reason"] == "corrupt_pdf"
+
+
+def test_verifier_records_results(tmp_path):
+    """
+    Test that checks run in worker processes and their results reach the metadata before it is written.
+    """
+    metadata_path = str(tmp_path / "Metadata2024.xlsx")
+    with MetadataWriter(metadata_path) as writer:
+        writer.submit("BR1", "Downloaded", status_detail="ok")
+        writer.submit("BR2", "Downloaded", status_detail="ok")
+        with PdfVerifier(writer, max_processes=2, count_pages=False) as verifier:
+            verifier.submit("BR1", write(tmp_path / "BR1.pdf", PDF_BYTES))
+            verifier.submit("BR2", write(tmp_path / "BR2.pdf", PDF_BYTES[:100]))
+        assert verifier.counts == {"ok": 1, "truncated_pdf": 1}
+
+    assert writer.table["BR1"]["pdf_downloaded"] == "Downloaded"
+    assert writer.table["BR1"]["verified"] is True
+    assert writer.table["BR1"]["bytes"] == len(PDF_BYTES)
+    assert writer.table["BR2"]["pdf_downloaded"] == "Not downloaded"
+    assert writer.table["BR2"]["status_detail"] == "truncated_pdf"
+    assert writer.table["BR2"]["verified"] is False
+
+
+def test_failed_file_is_downloaded_again(tmp_path):
+    """
+    Test that a file failing verification is deleted and dropped from the HTTP cache, so the next run
+    downloads it in full instead of reusing it after a "304 Not Modified".
+    """
+    df = pd.DataFrame({"BRnum": ["BR1"], "Pdf_URL": [None], "Report Html Address": [None]})
+    metadata_path = str(tmp_path / "Metadata2024.xlsx")
+    http_cache = HttpCache(str(tmp_path / "http_cache.json"))
+
+    def run():
+        run_threaded_execution(df, str(tmp_path), metadata_path, "Pdf_URL", "Report Html Address", "BRnum",
+                               http_cache=http_cache, verify_pdfs=True, verify_processes=1)
+        return pd.read_excel(metadata_path).set_index("BRnum").loc["BR1"]
+
+    with MockPdfServer() as server:
+        url = f"{server.base_urls[0]}/report.pdf?size=5000"
+        df["Pdf_URL"] = url
+        assert run()["verified"] == True
+        file_path = http_cache.lookup(url)["path"]
+
+        # The file gets damaged; the server still answers 304 to the conditional request of the next run,
+        # so the damaged file is reused, then caught by the check
+        with open(file_path, "r+b") as pdf_file:
+            pdf_file.truncate(3000)
+        record = run()
+        assert (record["pdf_downloaded"], record["status_detail"]) == ("Not downloaded", "truncated_pdf")
+        assert not os.path.exists(file_path)
+        assert http_cache.lookup(url) is None
+
+        # The run after that downloads the file in full
+        record = run()
+        assert (record["pdf_downloaded"], record["verified"]) == ("Downloaded", True)
+        assert os.path.getsize(file_path) == 5000
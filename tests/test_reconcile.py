@@ -0,0 +1,109 @@
+import pytest
+import pandas as pd
+import sys
+import os
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from reconcile import reconcile, write_report, apply_fixes
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """
+    A source sheet, a metadata file and a download folder with one example of each issue.
+    """
+    download_folder = tmp_path / "downloads"
+    download_folder.mkdir()
+    for name in ["BR1_a.pdf", "BR3_c.pdf", "BR5_e.pdf", "BR9_orphan.pdf", "BR7_g.pdf", "BR2_b.pdf.part"]:
+        (download_folder / name).write_bytes(b"%PDF-1.4")
+
+    source_df = pd.DataFrame({"BRnum": ["BR1", "BR2", "BR3", "BR4", "BR4", "BR5", "BR7"]})
+    metadata_file_path = str(tmp_path / "Metadata2024.xlsx")
+    pd.DataFrame({
+        "BRnum": ["BR1", "BR2", "BR3", "BR3", "BR5", "BR6", "BR7"],
+        "pdf_downloaded": ["Downloaded", "Downloaded", "Not downloaded", "Downloaded", "Not downloaded",
+                           "Not downloaded", "Not downloaded"],
+        "verified": [True, None, None, None, None, None, False],
+    }).to_excel(metadata_file_path, index=False)
+    return source_df, metadata_file_path, str(download_folder)
+
+
+def test_reconcile_finds_every_issue(corpus):
+    """
+    Test that each kind of difference is found, and only for the expected BRnums.
+    """
+    issues = reconcile(*corpus)
+    found = {name: list(rows.index) for name, rows in issues.items()}
+    assert found == {
+        "missing_in_metadata": ["BR4"],
+        "not_in_source": ["BR6"],
+        "duplicate_brnums": ["BR3", "BR4"],
+        "downloaded_without_file": ["BR2"],  # Only an unfinished ".part" file
+        "stale_status": ["BR5"],  # BR7 failed the PDF verification: not stale
+        "files_without_row": ["BR9"],
+    }
+    assert issues["duplicate_brnums"].loc["BR3", "pdf_downloaded"] == "Downloaded"  # Last entry wins
+
+
+def test_reconcile_without_metadata(tmp_path):
+    """
+    Test that every source BRnum is reported missing when there is no metadata file yet.
+    """
+    issues = reconcile(pd.DataFrame({"BRnum": ["BR1", "BR2"]}), str(tmp_path / "none.xlsx"), str(tmp_path / "none"))
+    assert list(issues["missing_in_metadata"].index) == ["BR1", "BR2"]
+
+
+def test_write_report(corpus, tmp_path):
+    """
+    Test that the report has a summary sheet and one sheet per non-empty issue.
+    """
+    report_path = str(tmp_path / "reports" / "reconcile_report.xlsx")
+    write_report(reconcile(*corpus), report_path)
+    sheets = pd.read_excel(report_path, sheet_name=None)
+    assert list(sheets) == ["summary", "missing_in_metadata", "not_in_source", "duplicate_brnums",
+                            "downloaded_without_file", "stale_status", "files_without_row"]
+    assert sheets["summary"].set_index("issue").loc["duplicate_brnums", "count"] == 2
+    assert list(sheets["files_without_row"]["BRnum"]) == ["BR9"]
+
+
+def test_apply_fixes(corpus):
+    """
+    Test that the fixes are applied in one write and leave nothing to fix but the reported-only issues.
+    """
+    source_df, metadata_file_path, download_folder = corpus
+    assert apply_fixes(reconcile(*corpus), metadata_file_path) == 4
+
+    metadata_df = pd.read_excel(metadata_file_path).set_index("BRnum")
+    assert metadata_df.index.is_unique
+    assert metadata_df.loc["BR2", "status_detail"] == "missing_file"
+    assert metadata_df.loc["BR4", "pdf_downloaded"] == "Not downloaded"
+    assert metadata_df.loc["BR5", "pdf_downloaded"] == "Downloaded"
+    assert metadata_df.loc["BR7", "pdf_downloaded"] == "Not downloaded"
+
+    remaining = {name: len(rows) for name, rows in reconcile(*corpus).items() if len(rows)}
+    assert remaining == {"not_in_source": 1, "duplicate_brnums": 1, "files_without_row": 1}
+
+
+def test_apply_fixes_keeps_numeric_brnums(tmp_path):
+    """
+    Test that numeric BRnums are fixed in place instead of being added again as text.
+    """
+    download_folder = tmp_path / "downloads"
+    download_folder.mkdir()
+    (download_folder / "1003_c.pdf").write_bytes(b"%PDF-1.4")
+    source_df = pd.DataFrame({"BRnum": [1001, 1002, 1003, None]})  # Float column because of the blank cell
+    metadata_file_path = str(tmp_path / "Metadata2024.xlsx")
+    pd.DataFrame({"BRnum": [1001, 1003], "pdf_downloaded": ["Downloaded", "Not downloaded"]}).to_excel(
+        metadata_file_path, index=False)
+
+    issues = reconcile(source_df, metadata_file_path, str(download_folder))
+    assert {name: list(rows.index) for name, rows in issues.items() if len(rows)} == {
+        "missing_in_metadata": ["1002"], "downloaded_without_file": ["1001"], "stale_status": ["1003"]}
+    assert apply_fixes(issues, metadata_file_path) == 3
+
+    metadata_df = pd.read_excel(metadata_file_path)
+    assert metadata_df["BRnum"].tolist() == [1001, 1002, 1003]
+    assert metadata_df["pdf_downloaded"].tolist() == ["Not downloaded", "Not downloaded", "Downloaded"]
+    assert not any(len(rows) for rows in reconcile(source_df, metadata_file_path, str(download_folder)).values())
@@ -0,0 +1,50 @@
+import pytest
+import pandas as pd
+import sys
+import os
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from resume import completed_brnums, filter_pending
+
+
+@pytest.fixture
+def run_state(tmp_path):
+    """
+    Create a metadata file and a download folder as left by a previous run.
+    """
+    metadata_path = tmp_path / "Metadata2024.xlsx"
+    pd.DataFrame([
+        {"BRnum": "BR0001", "pdf_downloaded": "Downloaded"},
+        {"BRnum": "BR0002", "pdf_downloaded": "Downloaded"},      # File was deleted
+        {"BRnum": "BR0003", "pdf_downloaded": "Not downloaded"},
+        {"BRnum": "BR0004", "pdf_downloaded": "Downloaded"},      # File is not a PDF
+    ]).to_excel(metadata_path, index=False)
+
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    (downloads / "BR0001_report.pdf").write_bytes(b"%PDF-1.7 ...")
+    (downloads / "BR0003_report.pdf.part").write_bytes(b"%PDF-1.7")
+    (downloads / "BR0002_report.pdf.link").write_bytes(b"%PDF-1.7 ...")  # Left by the content store
+    (downloads / "BR0004_report.pdf").write_bytes(b"<html>")
+    return str(metadata_path), str(downloads)
+
+
+def test_completed_brnums(run_state):
+    """
+    Test that only BRnums marked downloaded with a file on disk are complete.
+    """
+    metadata_path, downloads = run_state
+    assert completed_brnums(metadata_path, downloads) == {"BR0001", "BR0004"}
+    assert completed_brnums(metadata_path, downloads, verify=True) == {"BR0001"}
+
+
+def test_filter_pending(run_state):
+    """
+    Test that completed rows are removed from the source DataFrame.
+    """
+    metadata_path, downloads = run_state
+    df = pd.DataFrame({"BRnum": ["BR0001", "BR0002", "BR0003", "BR0004"]})
+    pending = filter_pending(df, "BRnum", completed_brnums(metadata_path, downloads, verify=True))
+    assert pending["BRnum"].tolist() == ["BR0002", "BR0003", "BR0004"]
@@ -0,0 +1,68 @@
+import pandas as pd
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import requests
+from retry_policy import (RetryPolicy, classify_exception, classify_status, OK, TIMED_OUT, HTTP_4XX,
+                          HTTP_5XX, THROTTLED, CONNECTION_ERROR)
+from threaded_executor import process_row
+
+
+def test_classification():
+    """
+    Test that exceptions and status codes map to the expected failure reasons.
+    """
+    assert classify_exception(requests.ReadTimeout()) == TIMED_OUT
+    assert classify_exception(requests.ConnectTimeout()) == TIMED_OUT
+    assert classify_exception(requests.ConnectionError()) == CONNECTION_ERROR
+    assert classify_status(404) == HTTP_4XX
+    assert classify_status(503) == HTTP_5XX
+    assert classify_status(429) == THROTTLED
+
+
+@patch("retry_policy.time.sleep")
+def test_retries_only_recoverable_failures(mock_sleep):
+    """
+    Test that a timeout is retried until success but a 404 is not retried.
+    """
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0)
+    outcomes = iter([(None, TIMED_OUT), ("Not downloaded", TIMED_OUT), ("Downloaded", OK)])
+    assert policy.call(lambda: next(outcomes)) == ("Downloaded", OK, 3)
+    assert mock_sleep.call_count == 2
+    assert all(0 <= call.args[0] <= 2.0 for call in mock_sleep.call_args_list)
+
+    assert policy.call(lambda: (None, HTTP_4XX)) == (None, HTTP_4XX, 1)
+
+
+@patch("retry_policy.time.sleep")
+def test_run_budget(mock_sleep):
+    """
+    Test that no retry happens once the run budget is used up.
+    """
+    policy = RetryPolicy(max_attempts=5, run_budget=2)
+    assert policy.call(lambda: (None, HTTP_5XX)) == (None, HTTP_5XX, 3)
+    assert policy.call(lambda: (None, HTTP_5XX)) == (None, HTTP_5XX, 1)
+
+
+@patch("retry_policy.time.sleep")
+@patch("threaded_executor.fetch_pdf")
+def test_process_row_records_reason(mock_fetch, mock_sleep):
+    """
+    Test that process_row retries, falls back to the alternative URL and records the failure reason.
+    """
+    mock_fetch.side_effect = [(None, HTTP_5XX, {}), (None, HTTP_5XX, {}), (None, TIMED_OUT, {}),
+                              ("Not downloaded", TIMED_OUT, {})]
+    writer = Mock()
+    row = pd.Series({"BRnum": "BR0001", "Pdf_URL": "https://a.com/r.pdf", "Report Html Address": "https://b.com/r.pdf"},
+                    name=0)
+
+    result = process_row(row, "downloads", "Pdf_URL", "Report Html Address", "BRnum", None,
+                         metadata_writer=writer, retry_policy=RetryPolicy(max_attempts=2))
+
+    assert result == ("BR0001", "Not downloaded")
+    writer.submit.assert_called_once_with("BR0001", "Not downloaded", status_detail=TIMED_OUT, attempts=4,
+                                          sha256=None)
@@ -0,0 +1,132 @@
+import csv
+import json
+import pandas as pd
+import sys
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import run_metrics
+from run_metrics import RunMetrics, LatencyHistogram
+from download_pdf import fetch_pdf
+from host_scheduler import HostScheduler
+from threaded_executor import run_threaded_execution
+
+
+def test_histogram_quantiles():
+    """
+    Test that quantiles return the upper bound of the bucket holding them.
+    """
+    histogram = LatencyHistogram()
+    for seconds in [0.02] * 90 + [3.0] * 10:
+        histogram.add(seconds)
+    assert histogram.quantile(0.5) == 0.025
+    assert histogram.quantile(0.99) == 5
+    summary = histogram.to_dict()
+    assert summary["count"] == 100
+    assert summary["buckets"] == {"<=0.025": 90, "<=5": 10}
+
+
+def test_nested_stages_are_exclusive():
+    """
+    Test that time spent in a nested stage is not counted in the enclosing one.
+    """
+    metrics = RunMetrics()
+    with metrics.row() as record:
+        with run_metrics.stage("validate"):
+            time.sleep(0.02)
+            with run_metrics.stage("download"):
+                time.sleep(0.05)
+                run_metrics.add_time("disk_write", 0.01)
+    assert 0.015 < record["validate"] < 0.05
+    assert 0.035 < record["download"] < 0.09
+    assert record["disk_write"] == 0.01
+
+
+def test_helpers_do_nothing_outside_a_row():
+    """
+    Test that the hot-path helpers can be called without metrics.
+    """
+    with run_metrics.stage("validate"):
+        run_metrics.add_bytes(10)
+        run_metrics.annotate(reason="ok")
+        run_metrics.request("https://a.com/r.pdf", 0.1, "ok")
+
+
+def test_report_and_row_csv(tmp_path):
+    """
+    Test that tracked rows end up in the JSON report and the per-row CSV file.
+    """
+    metrics = RunMetrics(str(tmp_path / "rows.csv"))
+
+    def process_row(brnum, ok):
+        with run_metrics.stage("metadata"):
+            run_metrics.add_bytes(1000 if ok else 0)
+            run_metrics.request(f"https://{'a' if ok else 'b'}.com/{brnum}.pdf", 0.2, "ok" if ok else "timeout")
+            run_metrics.annotate(reason="ok" if ok else "timeout", attempts=1)
+        return brnum, "Downloaded" if ok else "Not downloaded"
+
+    tracked = metrics.track(process_row)
+    assert tracked("BR0001", True) == ("BR0001", "Downloaded")
+    tracked("BR0002", False)
+    report = metrics.write_report(str(tmp_path / "report.json"))
+
+    assert json.loads((tmp_path / "report.json").read_text()) == report
+    assert report["rows"] == 2 and report["bytes"] == 1000
+    assert report["status_counts"] == {"Downloaded": 1, "Not downloaded": 1}
+    assert report["reason_counts"] == {"ok": 1, "timeout": 1}
+    assert set(report["hosts"]) == {"a.com", "b.com"}
+    assert report["stages"]["metadata"]["count"] == 2
+    with open(tmp_path / "rows.csv", newline="") as rows_file:
+        rows = list(csv.DictReader(rows_file))
+    assert [(row["brnum"], row["status"], row["reason"], row["bytes"]) for row in rows] == [
+        ("BR0001", "Downloaded", "ok", "1000"), ("BR0002", "Not downloaded", "timeout", "0")]
+
+
+@patch("download_pdf.get_session")
+def test_fetch_pdf_reports_download(mock_get_session, tmp_path):
+    """
+    Test that fetch_pdf books the body to the download and disk_write stages with its bytes.
+    """
+    mock_response = MagicMock()
+    mock_response.__enter__.return_value = mock_response
+    mock_response.status_code = 200
+    mock_response.headers = {"Content-Type": "application/pdf"}
+    mock_response.iter_content.return_value = iter([b"%PDF-1.7 ", b"rest"])
+    mock_get_session.return_value.get.return_value = mock_response
+
+    metrics = RunMetrics()
+    with metrics.row() as record:
+        status, _, _ = fetch_pdf("https://example.com/report.pdf", "BR0001", str(tmp_path))
+
+    assert status == "Downloaded"
+    assert record["bytes"] == 13
+    assert record["download"] > 0 and record["disk_write"] > 0
+
+
+@patch("threaded_executor.fetch_pdf")
+def test_host_latency_excludes_slot_wait(mock_fetch, tmp_path):
+    """
+    Test that the per-host latencies of the report measure the requests, not the wait for the host's slot.
+    """
+    def slow_fetch(*args, **kwargs):
+        time.sleep(0.005)
+        return "Downloaded", "ok", {"file_path": "x.pdf", "bytes": 100, "sha256": None}
+
+    mock_fetch.side_effect = slow_fetch
+    metrics = RunMetrics()
+    scheduler = HostScheduler(max_per_host=1, rate_per_host=10)  # One request per 0.1s to a.com
+    df = pd.DataFrame({"BRnum": [f"BR{i:04d}" for i in range(8)],
+                       "Pdf_URL": [f"https://a.com/{i}.pdf" for i in range(8)],
+                       "Report Html Address": [None] * 8})
+
+    with patch.object(metrics, "record_request", wraps=metrics.record_request) as record_request:
+        run_threaded_execution(df, str(tmp_path), str(tmp_path / "Metadata2024.xlsx"), "Pdf_URL",
+                               "Report Html Address", "BRnum", scheduler=scheduler, max_workers=4, metrics=metrics)
+
+    latencies = [call.args[1] for call in record_request.call_args_list]
+    assert len(latencies) == 8
+    assert max(latencies) < 0.08  # Rows queued behind the rate limit waited 0.1s or more
@@ -0,0 +1,77 @@
+import pytest
+import pandas as pd
+import sys
+import os
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from shard_runner import select_shard, shard_path, run_shards, merge_shards
+from metadata_writer import MetadataWriter
+
+
+@pytest.fixture
+def source_df():
+    return pd.DataFrame({"BRnum": [f"BR{i:04d}" for i in range(200)],
+                         "Pdf_URL": [f"https://host{i % 7}.com/{i}.pdf" for i in range(200)]})
+
+
+@pytest.mark.parametrize("by", ["brnum", "host"])
+def test_shards_partition_rows(source_df, by):
+    """
+    Test that the shards are disjoint, cover every row, and keep each host in one shard when sharding by host.
+    """
+    shards = [select_shard(source_df, index, 4, "BRnum", "Pdf_URL", by) for index in range(4)]
+    assert sorted(brnum for shard in shards for brnum in shard["BRnum"]) == list(source_df["BRnum"])
+    if by == "host":
+        hosts = [set(shard["Pdf_URL"].str.extract(r"//([^/]+)/")[0]) for shard in shards]
+        assert sum(len(shard_hosts) for shard_hosts in hosts) == 7
+    else:
+        assert all(len(shard) > 20 for shard in shards)
+
+
+def test_shard_path():
+    """
+    Test the names of the shard files.
+    """
+    assert shard_path("../metadata/Metadata2024.xlsx", 2, 8) == os.path.join("../metadata", "Metadata2024.shard-2-of-8.xlsx")
+    assert shard_path("m/Metadata2024.journal.jsonl", 0, 2) == os.path.join("m", "Metadata2024.shard-0-of-2.journal.jsonl")
+    assert shard_path("m/Metadata2024.xlsx", None, 8) == "m/Metadata2024.xlsx"
+    assert shard_path(None, 1, 8) is None
+
+
+def test_merge_shards(tmp_path):
+    """
+    Test that shard files and a leftover shard journal are merged into the metadata file, then removed.
+    """
+    metadata_path = str(tmp_path / "Metadata2024.xlsx")
+    journal_path = str(tmp_path / "Metadata2024.journal.jsonl")
+    with MetadataWriter(metadata_path) as writer:
+        writer.submit("BR0001", "Not downloaded", status_detail="timeout")
+        writer.submit("BR0009", "Downloaded", status_detail="ok")
+    with MetadataWriter(shard_path(metadata_path, 0, 2)) as writer:
+        writer.submit("BR0001", "Downloaded", status_detail="ok", attempts=2)
+    # Shard 1 was interrupted before writing its workbook: only its journal exists
+    writer = MetadataWriter(shard_path(metadata_path, 1, 2), journal_path=shard_path(journal_path, 1, 2))
+    writer.submit("BR0002", "Downloaded", status_detail="ok")
+    writer.journal.close()
+
+    assert merge_shards(metadata_path, 2, journal_path) == 2
+
+    merged = pd.read_excel(metadata_path).set_index("BRnum")
+    assert merged.loc["BR0001", "pdf_downloaded"] == "Downloaded"
+    assert merged.loc["BR0001", "attempts"] == 2
+    assert merged.loc["BR0002", "pdf_downloaded"] == "Downloaded"
+    assert merged.loc["BR0009", "pdf_downloaded"] == "Downloaded"
+    assert sorted(os.listdir(tmp_path)) == ["Metadata2024.xlsx"]
+
+
+def shard_label(shard_index, shard_count):
+    return f"{shard_index}/{shard_count}"
+
+
+def test_run_shards():
+    """
+    Test that every shard runs in its own process and the results come back in shard order.
+    """
+    assert run_shards(shard_label, 3) == ["0/3", "1/3", "2/3"]
@@ -0,0 +1,65 @@
+import pytest
+import pandas as pd
+import sys
+import os
+
+# Add the src directory to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from status_journal import StatusJournal
+from metadata_writer import MetadataWriter, compact_journal
+
+
+@pytest.fixture
+def paths(tmp_path):
+    """
+    Return the metadata and journal paths used by the tests.
+    """
+    return str(tmp_path / "Metadata2024.xlsx"), str(tmp_path / "Metadata2024.journal.jsonl")
+
+
+def test_journal_replay_ignores_torn_line(paths):
+    """
+    Test that replay returns complete records and skips a half-written last line.
+    """
+    _, journal_path = paths
+    journal = StatusJournal(journal_path, fsync_interval=0)
+    journal.append("BR0001", {"pdf_downloaded": "Downloaded"})
+    journal.append("BR0002", {"pdf_downloaded": "Not downloaded"})
+    journal.close()
+    with open(journal_path, "ab") as f:
+        f.write(b'{"BRnum": "BR00')
+
+    records = StatusJournal(journal_path).replay()
+    assert records == [("BR0001", {"pdf_downloaded": "Downloaded"}),
+                       ("BR0002", {"pdf_downloaded": "Not downloaded"})]
+
+
+def test_crashed_run_is_recovered(paths):
+    """
+    Test that updates journaled by a run that never flushed are materialized on startup.
+    """
+    metadata_path, journal_path = paths
+    writer = MetadataWriter(metadata_path, flush_every=1000, flush_interval=3600, journal_path=journal_path)
+    writer.submit("BR0002", "Downloaded")
+    writer.submit("BR0001", "Not downloaded")
+    writer.journal.close()  # Simulate a crash: the writer is never closed, nothing is flushed
+    assert not os.path.exists(metadata_path)
+
+    assert compact_journal(metadata_path, journal_path) == 2
+    metadata_df = pd.read_excel(metadata_path)
+    assert metadata_df["BRnum"].tolist() == ["BR0001", "BR0002"]
+    assert os.path.getsize(journal_path) == 0
+
+
+def test_flush_discards_journal(paths):
+    """
+    Test that the journal is emptied once its entries are in the workbook.
+    """
+    metadata_path, journal_path = paths
+    with MetadataWriter(metadata_path, journal_path=journal_path) as writer:
+        writer.submit("BR0001", "Downloaded")
+
+    assert os.path.getsize(journal_path) == 0
+    assert compact_journal(metadata_path, journal_path) == 0
+    assert pd.read_excel(metadata_path)["pdf_downloaded"].tolist() == ["Downloaded"]
@@ -0,0 +1,117 @@
+import pandas as pd
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+# Add the src and benchmarks directories to sys.path before importing project modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from url_prevalidator import collect_urls, probe_url, prevalidate, UrlChecks
+from threaded_executor import process_row
+from host_scheduler import HostScheduler
+from http_session import get_session
+from mock_server import MockPdfServer
+
+
+def make_response(status_code, content_type="", body=b""):
+    response = MagicMock(status_code=status_code, headers={"Content-Type": content_type})
+    response.__enter__.return_value = response
+    response.iter_content.return_value = iter([body])
+    return response
+
+
+def test_collect_urls_normalizes_and_deduplicates():
+    """
+    Test that both columns are collected once per distinct address.
+    """
+    df = pd.DataFrame({"Pdf_URL": ["https://a.com/1.pdf", " https://a.com/1.pdf#p=3", "http://b.com/2.pdf", None],
+                       "Report Html Address": ["https://A.com/1.pdf", "https://b.com/2.pdf", None, "https://c.com/"]})
+    assert collect_urls(df, "Pdf_URL", "Report Html Address") == ["https://a.com/1.pdf", "http://b.com/2.pdf",
+                                                                  "https://c.com/"]
+
+
+def test_probe_url_falls_back_to_range_get():
+    """
+    Test the HEAD answer, and the Range GET used when HEAD is refused or inconclusive.
+    """
+    session = MagicMock()
+    session.head.return_value = make_response(200, "application/pdf")
+    assert probe_url("https://a.com/r.pdf", session) == "ok"
+    session.get.assert_not_called()
+
+    session.head.return_value = make_response(404)
+    assert probe_url("https://a.com/r.pdf", session) == "http_4xx"
+
+    session.head.return_value = make_response(405)
+    session.get.return_value = make_response(206, "application/octet-stream", b"%PDF")
+    assert probe_url("https://a.com/r.pdf", session) == "ok"
+    assert session.get.call_args.kwargs["headers"] == {"Range": "bytes=0-3"}
+
+    session.head.return_value = make_response(200, "text/html")
+    assert probe_url("https://a.com/r.html", session) == "not_pdf"
+
+
+def test_prevalidate_probes_each_url_once():
+    """
+    Test that a sheet full of repeated URLs costs one request per distinct URL.
+    """
+    with MockPdfServer(hosts=2) as server:
+        pdf_url, html_url = f"{server.base_urls[0]}/r.pdf?size=100", f"{server.base_urls[1]}/r.html"
+        df = pd.DataFrame({"Pdf_URL": [pdf_url, html_url, f"{pdf_url} ", html_url] * 5,
+                           "Report Html Address": [None, pdf_url, None, f"{server.base_urls[1]}/missing"] * 5})
+        checks = prevalidate(df, "Pdf_URL", "Report Html Address", max_workers=4)
+        assert server.settings.requests == 3
+
+    assert checks.reason(pdf_url) == "ok"
+    assert checks.reason(html_url) == "not_pdf"
+    assert checks.skip(html_url) and not checks.skip(pdf_url)
+
+
+def test_process_row_skips_known_failures(tmp_path):
+    """
+    Test that the engine goes straight to the alternative URL when the primary one is known to be dead.
+    """
+    checks = UrlChecks({"a.com/dead.pdf": "http_4xx", "b.com/r.pdf": "ok"})
+    row = pd.Series({"BRnum": "BR1", "Pdf_URL": "https://a.com/dead.pdf", "Alt": "https://b.com/r.pdf"})
+    writer = MagicMock()
+    fetch = MagicMock(return_value=("Downloaded", "ok", {"file_path": "x.pdf", "sha256": "abc"}))
+    with patch("threaded_executor.fetch_pdf", fetch):
+        assert process_row(row, str(tmp_path), "Pdf_URL", "Alt", "BRnum", None, writer,
+                           url_checks=checks) == ("BR1", "Downloaded")
+    assert [call.args[0] for call in fetch.call_args_list] == ["https://b.com/r.pdf"]
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """
+    Answer every HEAD request with "429 Too Many Requests" and a Retry-After header.
+    """
+    def do_HEAD(self):
+        self.send_response(429)
+        self.send_header("Retry-After", "30")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_prevalidate_honours_retry_after():
+    """
+    Test that a host throttling the probes is paused for the downloads, and that the hook is removed afterwards.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scheduler = HostScheduler()
+    url = f"http://127.0.0.1:{server.server_address[1]}/r.pdf"
+    try:
+        checks = prevalidate(pd.DataFrame({"Pdf_URL": [url], "Alt": [None]}), "Pdf_URL", "Alt", scheduler=scheduler)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert checks.reason(url) == "http_429"
+    assert scheduler._state("127.0.0.1").reserve() > 20
+    assert scheduler.response_hook not in get_session().hooks["response"]
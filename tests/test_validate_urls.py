@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import Mock, patch
-from validate_urls import validate_url, get_valid_url
+from validate_urls import validate_url, get_valid_url, normalize_url, url_key, candidate_urls
 import pandas as pd
 
 # Path to your lightweight test file
@@ -14,11 +14,12 @@ def sample_data():
     """
     return pd.read_excel(excel_file_path)
 
-@patch("validate_urls.requests.get")
-def test_validate_url_success(mock_get, sample_data):
+@patch("validate_urls.get_session")
+def test_validate_url_success(mock_get_session, sample_data):
     """
     Test validate_url with valid and invalid URLs from the Excel file.
     """
+    mock_get = mock_get_session.return_value.get
     # Mock specific URL behavior
     def mock_get_side_effect(url, *args, **kwargs):
         mock_response = Mock()
@@ -39,11 +40,12 @@ def test_validate_url_success(mock_get, sample_data):
         print(f"Testing URL: {url} -> {is_valid}, Expected: {expected_valid}")
         assert is_valid == expected_valid
 
-@patch("validate_urls.requests.get")
-def test_get_valid_url_primary(mock_get, sample_data):
+@patch("validate_urls.get_session")
+def test_get_valid_url_primary(mock_get_session, sample_data):
     """
     Test get_valid_url with rows where the primary URL (Pdf_URL) is valid or invalid.
     """
+    mock_get = mock_get_session.return_value.get
     # Mock specific URL behavior
     def mock_get_side_effect(url, *args, **kwargs):
         mock_response = Mock()
@@ -68,3 +70,19 @@ def test_get_valid_url_primary(mock_get, sample_data):
             expected_url = row[primary_col]
         print(f"Row {index}: Primary: {row[primary_col]}, Fallback: {row[alternative_col]}, Result: {valid_url}, Expected: {expected_url}")
         assert valid_url == expected_url
+
+def test_normalize_url():
+    """
+    Test that trivially different spellings of a URL are normalized, and share a key across http and https.
+    """
+    assert normalize_url(" HTTPS://Example.COM:443/r.pdf#page=2 ") == "https://example.com/r.pdf"
+    assert normalize_url("http://example.com:8080/r.pdf?y=1") == "http://example.com:8080/r.pdf?y=1"
+    assert normalize_url("   ") is None
+    assert url_key("http://example.com/r.pdf") == url_key("https://EXAMPLE.com/r.pdf#x")
+
+def test_candidate_urls_deduplicates():
+    """
+    Test that a row whose alternative URL only differs in spelling from the primary one is tried once.
+    """
+    row = pd.Series({"Pdf_URL": "https://a.com/r.pdf ", "Report Html Address": "http://A.com/r.pdf"})
+    assert candidate_urls(row, "Pdf_URL", "Report Html Address") == ["https://a.com/r.pdf"]